@@ -0,0 +1,134 @@
+"""Seeded synthetic products and reviews at configurable scale.
+
+    python -m benchmarks.generate --db /tmp/bench.db --products 50 --reviews 100000
+"""
+import argparse
+import math
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+# Amazon rating distributions are J-shaped: mostly 5 stars, a bump at 1 star
+RATING_WEIGHTS = {1: 0.12, 2: 0.05, 3: 0.08, 4: 0.20, 5: 0.55}
+# Mean polarity per star rating, before noise
+RATING_POLARITY = {1: -0.45, 2: -0.2, 3: 0.05, 4: 0.3, 5: 0.5}
+POLARITY_NOISE = 0.25
+# Review length in characters is roughly log-normal: many one-liners, a long tail of essays
+LENGTH_MU = 5.0
+LENGTH_SIGMA = 0.9
+MAX_LENGTH = 5000
+
+POSITIVE_WORDS = ["great", "excellent", "amazing", "love", "perfect", "fast", "bright", "smooth", "best", "happy",
+                  "superb", "worth", "premium", "crisp", "reliable", "beautiful", "impressive", "recommend"]
+NEGATIVE_WORDS = ["bad", "poor", "terrible", "slow", "broken", "waste", "disappointed", "heating", "worst", "lag",
+                  "defective", "refund", "cheap", "drains", "useless", "returned", "issue", "fake"]
+NEUTRAL_WORDS = ["phone", "battery", "camera", "screen", "delivery", "box", "charger", "display", "day", "price",
+                 "product", "seller", "use", "month", "software", "update", "size", "color", "the", "and", "it", "is"]
+TITLES = {1: "Very disappointed", 2: "Not worth it", 3: "Average product", 4: "Good value", 5: "Excellent phone"}
+BRANDS = ["Samsung Galaxy", "Apple iPhone", "OnePlus", "Xiaomi Redmi", "Google Pixel", "Realme", "Vivo", "Oppo"]
+
+
+def _sentiment_label(polarity):
+    # Same thresholds as services.sentiment.analyze_sentiment
+    if polarity > 0.1:
+        return "Positive"
+    if polarity < -0.1:
+        return "Negative"
+    return "Neutral"
+
+
+def _review_text(rng, rating, length):
+    mood = POSITIVE_WORDS if rating >= 4 else NEGATIVE_WORDS if rating <= 2 else NEUTRAL_WORDS
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(mood) if rng.random() < 0.35 else rng.choice(NEUTRAL_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def generate_reviews(rng, product_ids, count, days=365, now=None):
+    """Yield review rows (product_id, title, text, rating, sentiment, polarity, created_at)"""
+    now = now or datetime(2026, 1, 1)
+    stars = list(RATING_WEIGHTS)
+    weights = list(RATING_WEIGHTS.values())
+    # Skew review volume across products so a few best sellers dominate
+    product_weights = [1 / (i + 1) for i in range(len(product_ids))]
+
+    for _ in range(count):
+        rating = rng.choices(stars, weights)[0]
+        polarity = max(-1.0, min(1.0, rng.gauss(RATING_POLARITY[rating], POLARITY_NOISE)))
+        length = max(3, min(MAX_LENGTH, int(math.exp(rng.gauss(LENGTH_MU, LENGTH_SIGMA)))))
+        created_at = now - timedelta(seconds=rng.randrange(days * 86400))
+        yield (
+            rng.choices(product_ids, product_weights)[0],
+            TITLES[rating],
+            _review_text(rng, rating, length),
+            float(rating),
+            _sentiment_label(polarity),
+            round(polarity, 4),
+            created_at.strftime("%Y-%m-%d %H:%M:%S")
+        )
+
+
+def generate_dataset(db_path, products=20, reviews=10000, seed=42, batch_size=5000):
+    """Create products and reviews in db_path with the app schema; returns timing and size info"""
+    # Imported here so DB_PATH can be set by the caller before configs.database reads it
+    from configs import database
+
+    rng = random.Random(seed)
+    database.DB_NAME = db_path
+    database.init_db()
+
+    conn = sqlite3.connect(db_path)
+    product_ids = [f"{seed:04x}{i:012x}" for i in range(products)]
+    conn.executemany("""
+        INSERT INTO products (product_id, product_name, product_url, product_image, product_price)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(
+        pid,
+        f"{rng.choice(BRANDS)} Model {i}",
+        f"https://www.amazon.in/dp/B{seed % 100:02d}{i:07d}",
+        "",
+        f"{rng.randrange(8, 150) * 1000:,}"
+    ) for i, pid in enumerate(product_ids)])
+
+    start = time.perf_counter()
+    batch = []
+    for row in generate_reviews(rng, product_ids, reviews):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _insert(conn, batch)
+            batch = []
+    if batch:
+        _insert(conn, batch)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+
+    return {"products": products, "reviews": reviews, "seed": seed, "seconds": round(elapsed, 3)}
+
+
+def _insert(conn, rows):
+    conn.executemany("""
+        INSERT INTO reviews (product_id, review_title, review_text, rating, sentiment, polarity, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="SQLite file to create or append to")
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--reviews", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    info = generate_dataset(args.db, args.products, args.reviews, args.seed)
+    print(f"Generated {info['reviews']} reviews for {info['products']} products in {info['seconds']}s -> {args.db}")
+
+
+if __name__ == "__main__":
+    main()
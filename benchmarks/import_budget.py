@@ -0,0 +1,75 @@
+"""Fail when cold-importing the app regresses past its budget.
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget-ms 800 --runs 5
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and takes the best
+cumulative time for `main`. Also fails if a module that must stay lazy (matplotlib,
+TextBlob/nltk, scipy) is imported at startup, which is a machine-independent check.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.run import THRESHOLDS_FILE
+
+# Loaded on first use or by the background pre-warm, never by `import main`
+LAZY_MODULES = ("matplotlib", "textblob", "nltk", "scipy", "numpy")
+
+
+def measure(module="main"):
+    """Cumulative import time in microseconds of every module loaded by one cold import"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        # Skip the "self [us] | cumulative | imported package" header
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        cumulative[fields[2].strip()] = int(fields[1])
+    return cumulative
+
+
+def main():
+    with open(THRESHOLDS_FILE) as f:
+        default_budget = json.load(f).get("import_budget_ms", 1000)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=default_budget)
+    parser.add_argument("--runs", type=int, default=3, help="Cold imports to run; the fastest counts")
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to print")
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.runs):
+        timings = measure()
+        if best is None or timings["main"] < best["main"]:
+            best = timings
+
+    total_ms = best["main"] / 1000
+    print(f"import main: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    for name, us in sorted(best.items(), key=lambda item: item[1], reverse=True)[1:args.top + 1]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    eager = sorted({name.split(".")[0] for name in best} & set(LAZY_MODULES))
+    if eager:
+        failures.append(f"imported at startup but should be lazy: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"cold start {total_ms:.1f} ms exceeds budget of {args.budget_ms:.0f} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
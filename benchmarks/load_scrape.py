@@ -0,0 +1,126 @@
+"""Drive N concurrent /api/scrape requests against the mock storefront and report throughput.
+
+    python -m benchmarks.load_scrape --concurrency 20 --pages 10 --latency 0.1 --block-rate 0.02
+
+The app runs in-process on this script's event loop, so the reported event-loop lag is the
+lag the scrape pipeline inflicts on every other request a real worker would be serving.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.mock_amazon import add_config_arguments, config_from_args, start_server
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def monitor_loop_lag(samples, stop, interval=0.01):
+    """Record how late a periodic timer fires; blocking calls on the loop show up as lag"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def scrape_one(client, url):
+    start = time.perf_counter()
+    final = {"type": "error", "message": "stream ended without a final event"}
+    async with client.stream("POST", "/api/scrape", data={"url": url}) as response:
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event.get("type") in ("completed", "error"):
+                final = event
+    return time.perf_counter() - start, final
+
+
+async def run_load(app, base_url, concurrency, asin_offset=0):
+    import httpx
+
+    lag_samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lag_samples, stop))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=None) as client:
+        urls = [f"{base_url}/dp/B{asin_offset + i:09d}" for i in range(concurrency)]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(scrape_one(client, url) for url in urls))
+        wall = time.perf_counter() - start
+
+    stop.set()
+    await monitor
+    return results, wall, lag_samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent scrapes of distinct products")
+    parser.add_argument("--delay-scale", type=float, default=0.0,
+                        help="Scale for the scraper's politeness sleeps (0 = none)")
+    parser.add_argument("--output", help="Write results JSON here")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    db_path = os.path.join(tempfile.mkdtemp(prefix="review-load-"), "load.db")
+    os.environ["DB_PATH"] = db_path
+
+    server, base_url = start_server(config_from_args(args))
+
+    from services import scraper
+    scraper.SCRAPE_DELAY_SCALE = args.delay_scale
+    import main as app_module
+    from configs.database import init_db
+    init_db()
+
+    results, wall, lag = asyncio.run(run_load(app_module.app, base_url, args.concurrency))
+    server.shutdown()
+
+    conn = sqlite3.connect(db_path)
+    review_count = conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+    conn.close()
+
+    latencies = [seconds for seconds, _ in results]
+    outcomes = {}
+    for _, event in results:
+        outcomes[event["type"]] = outcomes.get(event["type"], 0) + 1
+
+    report = {
+        "concurrency": args.concurrency,
+        "storefront": vars(config_from_args(args)),
+        "wall_seconds": round(wall, 3),
+        "reviews_stored": review_count,
+        "reviews_per_second": round(review_count / wall, 2) if wall else 0,
+        "outcomes": outcomes,
+        "latency_seconds": {
+            "median": round(statistics.median(latencies), 3),
+            "p99": round(_percentile(latencies, 0.99), 3),
+            "max": round(max(latencies), 3)
+        },
+        "event_loop_lag_ms": {
+            "median": round(statistics.median(lag) * 1000, 2) if lag else 0,
+            "p99": round(_percentile(lag, 0.99) * 1000, 2),
+            "max": round(max(lag, default=0) * 1000, 2)
+        }
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
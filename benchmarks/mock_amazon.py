@@ -0,0 +1,196 @@
+"""Local Amazon stand-in serving product and paginated review pages for offline scraper tests.
+
+    python -m benchmarks.mock_amazon --port 8081 --pages 10 --latency 0.2 --block-rate 0.05
+
+Pages use the markup the amazon profile in configs/marketplaces.json selects on (#productTitle,
+div[data-hook='review'], li.a-last a, ...), which the scraper falls back to for unknown hosts
+such as 127.0.0.1. Any 10-character ASIN is a valid product, so load tests can use distinct
+products: http://127.0.0.1:8081/dp/B000000001
+"""
+import argparse
+import html
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CAPTCHA_PAGE = """<html><body><h4>Enter the characters you see below</h4>
+<p>Sorry, we just need to make sure you're not a robot.</p><form action="/errors/validateCaptcha"></form></body></html>"""
+
+PRODUCT_PAGE = """<html><head><title>{name}</title></head><body>
+<div id="dp"><h1 id="title"><span id="productTitle">{name}</span></h1>
+<div id="imgTagWrapperId"><img id="landingImage" src="https://m.media-amazon.com/images/I/{asin}.jpg"></div>
+<div id="corePrice_feature_div"><span class="a-price"><span class="a-offscreen">&#8377;{price}</span>
+<span class="a-price-whole">{price}</span></span></div></div></body></html>"""
+
+REVIEW_BLOCK = """<div id="customer_review-R{asin}{page:03d}{index:02d}" data-hook="review" class="a-section review">
+<a data-hook="review-title" class="review-title"><i data-hook="review-star-rating" class="a-icon-star">
+<span class="a-icon-alt">{rating}.0 out of 5 stars</span></i><span>{title}</span></a>
+<span data-hook="review-date">Reviewed in India on 1 January 2026</span>
+<span data-hook="review-body" class="review-text-content"><span>{text}</span></span></div>"""
+
+REVIEW_PAGE = """<html><head><title>Customer reviews</title></head><body>
+<div id="cm_cr-review_list">{reviews}</div>
+<div id="cm_cr-pagination_bar"><ul class="a-pagination">{pagination}</ul></div></body></html>"""
+
+WORDS = {
+    1: ["terrible", "broken", "waste", "refund", "slow", "heating"],
+    3: ["okay", "average", "decent", "fine", "expected", "alright"],
+    5: ["excellent", "love", "amazing", "perfect", "fast", "brilliant"],
+}
+FILLER = ["phone", "camera", "battery", "screen", "the", "is", "and", "very", "display", "delivery"]
+
+
+@dataclass
+class StorefrontConfig:
+    pages: int = 10
+    reviews_per_page: int = 10
+    latency: float = 0.0
+    jitter: float = 0.0
+    # Fraction of responses replaced by a 503 or a captcha page
+    block_rate: float = 0.0
+    # Fraction of review pages with truncated markup or missing review fields
+    malformed_rate: float = 0.0
+    seed: int = 0
+
+
+def _review(rng, asin, page, index):
+    rating = rng.choices([1, 2, 3, 4, 5], [12, 5, 8, 20, 55])[0]
+    mood = WORDS[1] if rating <= 2 else WORDS[3] if rating == 3 else WORDS[5]
+    words = [rng.choice(mood) if rng.random() < 0.3 else rng.choice(FILLER) for _ in range(rng.randint(5, 80))]
+    return REVIEW_BLOCK.format(
+        asin=asin, page=page, index=index, rating=rating,
+        title=html.escape(f"{mood[0].title()} product"), text=html.escape(" ".join(words))
+    )
+
+
+def render_product_page(asin):
+    rng = random.Random(asin)
+    return PRODUCT_PAGE.format(name=f"Mock Phone {asin}", asin=asin, price=f"{rng.randrange(8, 150) * 1000:,}")
+
+
+def render_review_page(config, asin, page, malformed=False):
+    # Content is a function of (seed, asin, page) so repeated runs compare like with like
+    rng = random.Random(f"{config.seed}-{asin}-{page}")
+    blocks = [_review(rng, asin, page, i) for i in range(config.reviews_per_page)]
+    pagination = '<li class="a-disabled">Previous page</li>'
+    if page < config.pages:
+        pagination += f'<li class="a-last"><a href="/product-reviews/{asin}/ref=cm_cr_arp_d_paging_btm_next_{page + 1}?ie=UTF8&amp;reviewerType=all_reviews&amp;pageNumber={page + 1}">Next page</a></li>'
+    body = REVIEW_PAGE.format(reviews="\n".join(blocks), pagination=pagination)
+
+    if malformed:
+        mode = rng.choice(["truncate", "strip_bodies", "strip_ratings"])
+        if mode == "truncate":
+            body = body[:rng.randrange(len(body) // 4, len(body))]
+        elif mode == "strip_bodies":
+            body = body.replace('data-hook="review-body"', 'data-hook="x"').replace("review-text-content", "x")
+        else:
+            body = re.sub(r"\d\.0 out of 5 stars", "", body)
+    return body
+
+
+def make_handler(config):
+    rng = random.Random(config.seed)
+    rng_lock = threading.Lock()
+
+    def roll(rate):
+        with rng_lock:
+            return rng.random() < rate
+
+    class StorefrontHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body):
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if config.latency or config.jitter:
+                with rng_lock:
+                    delay = max(0.0, config.latency + rng.uniform(-config.jitter, config.jitter))
+                time.sleep(delay)
+
+            parts = urlsplit(self.path)
+            product = re.match(r"^/(?:[^/]+/)?dp/([A-Z0-9]{10})", parts.path, re.IGNORECASE)
+            reviews = re.match(r"^/product-reviews/([A-Z0-9]{10})", parts.path, re.IGNORECASE)
+            if not product and not reviews:
+                self._send(404, "<html><body>Not found</body></html>")
+                return
+
+            if roll(config.block_rate):
+                if roll(0.5):
+                    self._send(503, "<html><body>Service Unavailable</body></html>")
+                else:
+                    self._send(200, CAPTCHA_PAGE)
+                return
+
+            if product:
+                self._send(200, render_product_page(product.group(1).upper()))
+                return
+
+            page = int(parse_qs(parts.query).get("pageNumber", ["1"])[0])
+            if page > config.pages:
+                self._send(404, "<html><body>Not found</body></html>")
+                return
+            self._send(200, render_review_page(config, reviews.group(1).upper(), page, roll(config.malformed_rate)))
+
+    return StorefrontHandler
+
+
+def start_server(config, host="127.0.0.1", port=0):
+    """Serve the mock storefront on a daemon thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-amazon", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_config_arguments(parser):
+    parser.add_argument("--pages", type=int, default=10, help="Review pages per product")
+    parser.add_argument("--reviews-per-page", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- seconds around --latency")
+    parser.add_argument("--block-rate", type=float, default=0.0, help="Fraction of 503/captcha responses")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of malformed review pages")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def config_from_args(args):
+    return StorefrontConfig(
+        pages=args.pages,
+        reviews_per_page=args.reviews_per_page,
+        latency=args.latency,
+        jitter=args.jitter,
+        block_rate=args.block_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_server(config_from_args(args), args.host, args.port)
+    print(f"Mock storefront at {base_url}/dp/B000000001 (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
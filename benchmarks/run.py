@@ -0,0 +1,246 @@
+"""End-to-end benchmarks over a synthetic dataset, run in-process against the ASGI app.
+
+    python -m benchmarks.run --reviews 100000 --output bench.json
+    python -m benchmarks.run --reviews 100000 --baseline bench.json
+
+Run from the repository root (templates and static files are resolved relative to it).
+Exits non-zero when a benchmark regresses past its threshold in benchmarks/thresholds.json.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import generate_dataset
+
+THRESHOLDS_FILE = os.path.join(os.path.dirname(__file__), "thresholds.json")
+
+ROUTES = [
+    "/dashboard",
+    "/products",
+    "/reviews",
+    "/api/reviews",
+    "/api/product-reviews/{product_id}",
+    "/plots/review_length",
+    "/plots/sentiment_polarity",
+    "/plots/length_by_rating",
+    "/plots/rating_spread",
+]
+
+
+def _timings(fn, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "repeat": repeat
+    }
+
+
+def _clear_caches(app_module):
+    """Empty every memoize_on_data_version() cache in main, so the next request does the real work"""
+    for value in vars(app_module).values():
+        if callable(getattr(value, "cache_clear", None)):
+            value.cache_clear()
+
+
+def bench_routes(client, app_module, product_id, routes, repeat):
+    """Time each route cold (memoized stats, plots and pages cleared first) and warm (served from them).
+
+    The cold timings keep their original names so baselines from before the caches
+    existed still catch slower stats, plot or template work.
+    """
+    results = {}
+    for route in routes:
+        path = route.format(product_id=product_id)
+        response = client.get(path)
+        response.raise_for_status()
+
+        def fetch():
+            client.get(path)
+
+        results[f"route {route}"] = dict(_timings(fetch, repeat, lambda: _clear_caches(app_module)), bytes=len(response.content))
+        results[f"route {route} warm"] = dict(_timings(fetch, repeat), bytes=len(response.content))
+    return results
+
+
+def bench_stats(db_path, repeat):
+    from services.stats import (
+        calculate_stats, calculate_correlations, calculate_detailed_sentiment_distribution,
+        calculate_advanced_metrics, get_sentiment_by_rating
+    )
+    import sqlite3
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute("SELECT sentiment, rating, polarity, review_text FROM reviews").fetchall()
+    conn.close()
+    reviews = [{"sentiment": r["sentiment"], "rating": r["rating"], "polarity": r["polarity"], "review_text": r["review_text"]} for r in rows]
+
+    results = {}
+    for fn in (calculate_stats, calculate_correlations, calculate_detailed_sentiment_distribution,
+               calculate_advanced_metrics, get_sentiment_by_rating):
+        results[f"stats {fn.__name__}"] = _timings(lambda: fn(reviews), repeat)
+    return results
+
+
+def bench_parse(repeat, pages=10):
+    """Parse mock review pages in the default markup and in one that only the fallback selectors match"""
+    from benchmarks.mock_amazon import StorefrontConfig, render_review_page
+    from services.scraper import parse_review_page
+
+    config = StorefrontConfig(pages=pages)
+    standard = [render_review_page(config, "B000000001", page) for page in range(1, pages + 1)]
+    # Without data-hook attributes every field needs its fallback selector
+    fallback = [html.replace(' data-hook="review"', "").replace(' data-hook="review-title"', "")
+                .replace(' data-hook="review-body"', "").replace(' data-hook="review-star-rating"', "")
+                for html in standard]
+
+    results = {}
+    for name, htmls in (("standard", standard), ("fallback", fallback)):
+        def parse_all():
+            for html in htmls:
+                parse_review_page(html)
+
+        results[f"parse {name} review pages"] = dict(_timings(parse_all, repeat), pages=len(htmls))
+    return results
+
+
+def bench_ingestion(db_path, sample_size):
+    """Score and insert sample_size reviews the way the scrape stream does"""
+    import sqlite3
+    from services.sentiment import analyze_sentiment
+
+    conn = sqlite3.connect(db_path)
+    texts = [row[0] for row in conn.execute("SELECT review_text FROM reviews LIMIT ?", (sample_size,))]
+    product_id = conn.execute("SELECT product_id FROM products LIMIT 1").fetchone()[0]
+
+    start = time.perf_counter()
+    scored = [analyze_sentiment(text) for text in texts]
+    sentiment_ms = (time.perf_counter() - start) * 1000
+
+    rows = [(product_id, "Review", text, 5.0, sentiment, polarity) for text, (sentiment, polarity) in zip(texts, scored)]
+    start = time.perf_counter()
+    conn.executemany("""
+        INSERT INTO reviews (product_id, review_title, review_text, rating, sentiment, polarity)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    insert_ms = (time.perf_counter() - start) * 1000
+    conn.close()
+
+    count = max(1, len(texts))
+    return {
+        "ingest sentiment": {"total_ms": round(sentiment_ms, 3), "per_review_ms": round(sentiment_ms / count, 4), "median_ms": round(sentiment_ms, 3)},
+        "ingest insert": {"total_ms": round(insert_ms, 3), "per_review_ms": round(insert_ms / count, 4), "median_ms": round(insert_ms, 3)}
+    }
+
+
+def compare(results, baseline, thresholds):
+    """Return a list of regressions of results against baseline under the configured ratios"""
+    default_ratio = thresholds.get("default_max_ratio", 1.25)
+    noise_floor = thresholds.get("noise_floor_ms", 1.0)
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if previous is None:
+            continue
+        ratio = thresholds.get("max_ratio", {}).get(name, default_ratio)
+        # Sub-millisecond timings are dominated by noise
+        if current["median_ms"] > noise_floor and current["median_ms"] > previous["median_ms"] * ratio:
+            regressions.append(f"{name}: {previous['median_ms']} ms -> {current['median_ms']} ms (limit x{ratio})")
+    for name, budget in thresholds.get("budget_ms", {}).items():
+        current = results["benchmarks"].get(name)
+        if current is not None and current["median_ms"] > budget:
+            regressions.append(f"{name}: {current['median_ms']} ms over budget of {budget} ms")
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--reviews", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ingest-sample", type=int, default=200)
+    parser.add_argument("--routes", nargs="*", default=ROUTES,
+                        help="Routes to time; drop /reviews and /api/reviews at multi-million scale, they return every row")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Results JSON from an earlier commit to compare against")
+    parser.add_argument("--thresholds", default=THRESHOLDS_FILE)
+    args = parser.parse_args()
+
+    # Keep per-request logs out of the timings
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    workdir = tempfile.mkdtemp(prefix="review-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+    # Must be set before main (and configs.database) are imported
+    os.environ["DB_PATH"] = db_path
+
+    generated = generate_dataset(db_path, args.products, args.reviews, args.seed)
+    print(f"Generated {args.reviews} reviews in {generated['seconds']}s at {db_path}")
+
+    from fastapi.testclient import TestClient
+    import main as app_module
+
+    benchmarks = {"generate dataset": {"median_ms": round(generated["seconds"] * 1000, 3)}}
+    with TestClient(app_module.app) as client:
+        product_id = client.get("/debug/database").json()["products"][0]["product_id"]
+        benchmarks.update(bench_routes(client, app_module, product_id, args.routes, args.repeat))
+    benchmarks.update(bench_stats(db_path, args.repeat))
+    benchmarks.update(bench_parse(args.repeat))
+    benchmarks.update(bench_ingestion(db_path, args.ingest_sample))
+
+    results = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "scale": {"products": args.products, "reviews": args.reviews, "seed": args.seed},
+        "benchmarks": benchmarks
+    }
+
+    for name, timing in benchmarks.items():
+        print(f"{name:50s} {timing['median_ms']:>12.3f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+        if baseline.get("scale") != results["scale"]:
+            print(f"Warning: baseline scale {baseline.get('scale')} differs from {results['scale']}")
+        regressions = compare(results, baseline, thresholds)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,49 @@
+import os
 import sqlite3
+import logging
+import threading
 
-DB_NAME = "sqlite.db"
+logger = logging.getLogger(__name__)
+
+DB_NAME = os.environ.get("DB_PATH", "sqlite.db")
+# Milliseconds a connection waits for another worker's write lock before failing
+BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+
+_version_conn = None
+_version_lock = threading.Lock()
 
 def get_db():
     conn = sqlite3.connect(DB_NAME)
     conn.row_factory = sqlite3.Row
-    print("✅ DB Connected Successfully")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    logger.debug("DB connection opened")
     return conn
 
 
+def data_version():
+    """Number that changes whenever any connection, in any process, commits to the database.
+
+    Backed by PRAGMA data_version on a long-lived connection of this process that never
+    writes, so every commit (including this process's own, made on other connections)
+    shows up. Values are only comparable within one process.
+    """
+    global _version_conn
+    with _version_lock:
+        if _version_conn is None:
+            _version_conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+        return _version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+
 def init_db():
     conn = get_db()
     cursor = conn.cursor()
+
+    # Lets retention hand freed pages back with PRAGMA incremental_vacuum. Only takes effect
+    # on a new database; an existing one keeps its mode until a full VACUUM.
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    # WAL lets readers in every worker proceed while one worker writes
+    cursor.execute("PRAGMA journal_mode=WAL")
     
     # Drop existing tables to clean up (sqlite_sequence will be dropped automatically)
     # cursor.execute("DROP TABLE IF EXISTS reviews")
@@ -43,6 +75,172 @@ def init_db():
         )
     """)
 
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reviews_product ON reviews (product_id)")
+
+    # Where each product's scrape got to. Updated in the same transaction as the
+    # page's review inserts, so resuming from next_url never re-inserts a page.
+    # next_offset counts reviews of next_url's page already stored, when limit cut it short.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+            product_id TEXT PRIMARY KEY,
+            product_url TEXT NOT NULL,
+            next_url TEXT,
+            next_offset INTEGER NOT NULL DEFAULT 0,
+            pages_done INTEGER NOT NULL DEFAULT 0,
+            review_count INTEGER NOT NULL DEFAULT 0,
+            review_limit INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            error TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Added after the table was introduced; databases created before it need the column
+    checkpoint_columns = {row["name"] for row in cursor.execute("PRAGMA table_info(scrape_checkpoints)")}
+    if "next_offset" not in checkpoint_columns:
+        try:
+            cursor.execute("ALTER TABLE scrape_checkpoints ADD COLUMN next_offset INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            # Another worker starting at the same time added it first
+            pass
+
+    # Hash of the product details last stored by enrichment, so a refresh that finds
+    # nothing new writes nothing (and leaves every data-version cache valid)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS product_details_state (
+            product_id TEXT PRIMARY KEY,
+            details_hash TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # One row per observed price change, not per check
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS product_price_history (
+            product_id TEXT NOT NULL,
+            observed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            price TEXT,
+            price_value REAL,
+            PRIMARY KEY (product_id, observed_at)
+        ) WITHOUT ROWID
+    """)
+
+    # Reviews moved out of the live table by retention: one row per archive file
+    # (paths relative to services.retention.ARCHIVE_DIR)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_archives (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id TEXT NOT NULL,
+            path TEXT NOT NULL UNIQUE,
+            first_review_id INTEGER NOT NULL,
+            last_review_id INTEGER NOT NULL,
+            review_count INTEGER NOT NULL,
+            oldest TIMESTAMP,
+            newest TIMESTAMP,
+            bytes INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archives_product ON review_archives (product_id, last_review_id)")
+
+    # Per-product overrides of the default retention; NULL fields fall back to the defaults
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS retention_policies (
+            product_id TEXT PRIMARY KEY,
+            max_age_days INTEGER,
+            keep_latest INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Per-product daily aggregates, maintained at insert time by the trigger below.
+    # Sums (not averages) so days re-aggregate exactly into weeks and months.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_daily_rollups (
+            product_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            review_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum REAL NOT NULL DEFAULT 0,
+            polarity_sum REAL NOT NULL DEFAULT 0,
+            polarity_sq_sum REAL NOT NULL DEFAULT 0,
+            positive_count INTEGER NOT NULL DEFAULT 0,
+            neutral_count INTEGER NOT NULL DEFAULT 0,
+            negative_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (product_id, day)
+        ) WITHOUT ROWID
+    """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rollups_day ON review_daily_rollups (day)")
+
+    # Recreated on every start so databases keep the current definition. Reviews without a
+    # product have no rollup; a missing sentiment or timestamp counts as neither / today.
+    cursor.execute("DROP TRIGGER IF EXISTS reviews_daily_rollup")
+    cursor.execute("""
+        CREATE TRIGGER reviews_daily_rollup AFTER INSERT ON reviews
+        WHEN NEW.product_id IS NOT NULL
+        BEGIN
+            INSERT INTO review_daily_rollups (
+                product_id, day, review_count, rating_sum, polarity_sum, polarity_sq_sum,
+                positive_count, neutral_count, negative_count
+            ) VALUES (
+                NEW.product_id,
+                date(COALESCE(NEW.created_at, CURRENT_TIMESTAMP)),
+                1,
+                COALESCE(NEW.rating, 0),
+                COALESCE(NEW.polarity, 0),
+                COALESCE(NEW.polarity, 0) * COALESCE(NEW.polarity, 0),
+                COALESCE(NEW.sentiment = 'Positive', 0),
+                COALESCE(NEW.sentiment = 'Neutral', 0),
+                COALESCE(NEW.sentiment = 'Negative', 0)
+            )
+            ON CONFLICT (product_id, day) DO UPDATE SET
+                review_count = review_count + 1,
+                rating_sum = rating_sum + excluded.rating_sum,
+                polarity_sum = polarity_sum + excluded.polarity_sum,
+                polarity_sq_sum = polarity_sq_sum + excluded.polarity_sq_sum,
+                positive_count = positive_count + excluded.positive_count,
+                neutral_count = neutral_count + excluded.neutral_count,
+                negative_count = negative_count + excluded.negative_count;
+        END
+    """)
     conn.commit()
+
+    _backfill_rollups(conn)
+
     conn.close()
-    print("Database tables initialized successfully")
\ No newline at end of file
+    logger.info("Database tables initialized successfully")
+
+
+def _backfill_rollups(conn):
+    """Build rollups for reviews stored before the rollup trigger existed"""
+    # IMMEDIATE so two workers starting together cannot both backfill
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        has_rollups = conn.execute("SELECT EXISTS (SELECT 1 FROM review_daily_rollups)").fetchone()[0]
+        has_reviews = conn.execute("SELECT EXISTS (SELECT 1 FROM reviews)").fetchone()[0]
+        if has_reviews and not has_rollups:
+            conn.execute("""
+                INSERT INTO review_daily_rollups (
+                    product_id, day, review_count, rating_sum, polarity_sum, polarity_sq_sum,
+                    positive_count, neutral_count, negative_count
+                )
+                SELECT
+                    product_id,
+                    date(COALESCE(created_at, CURRENT_TIMESTAMP)),
+                    COUNT(*),
+                    SUM(COALESCE(rating, 0)),
+                    SUM(COALESCE(polarity, 0)),
+                    SUM(COALESCE(polarity, 0) * COALESCE(polarity, 0)),
+                    SUM(COALESCE(sentiment = 'Positive', 0)),
+                    SUM(COALESCE(sentiment = 'Neutral', 0)),
+                    SUM(COALESCE(sentiment = 'Negative', 0))
+                FROM reviews
+                WHERE product_id IS NOT NULL
+                GROUP BY product_id, date(COALESCE(created_at, CURRENT_TIMESTAMP))
+            """)
+            logger.info("Backfilled daily review rollups")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
\ No newline at end of file
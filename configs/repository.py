@@ -0,0 +1,246 @@
+"""Awaitable access to the queries the routes in main.py run.
+
+Every function here runs its SQLite work on DB_EXECUTOR, a small dedicated thread
+pool with a bounded queue, and returns plain dicts so no sqlite3 object crosses back
+to the event loop. The blocking version of each is available as .sync for code that
+already runs on a worker thread (memoized helpers on the render executor).
+"""
+import os
+
+from configs.database import get_db
+from services.executors import BoundedExecutor, awaitable_on
+from services.ingest import save_checkpoint
+from services.retention import clear_archives
+
+# SQLite serializes writers anyway; a few threads are enough to overlap reads
+DB_EXECUTOR = BoundedExecutor(
+    "db",
+    int(os.environ.get("DB_THREADS", "4")),
+    int(os.environ.get("DB_MAX_PENDING", "64"))
+)
+
+run_db = DB_EXECUTOR.run
+# For background pipeline work (page commits, checkpoints, enrichment) that waits rather than failing under load
+run_db_background = DB_EXECUTOR.run_background
+
+
+def _fetch_all(sql, params=()):
+    conn = get_db()
+    try:
+        return [dict(row) for row in conn.execute(sql, params).fetchall()]
+    finally:
+        conn.close()
+
+
+def _fetch_one(sql, params=()):
+    conn = get_db()
+    try:
+        row = conn.execute(sql, params).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+@awaitable_on(DB_EXECUTOR)
+def product_by_url(url):
+    return _fetch_one("SELECT product_id, product_name FROM products WHERE product_url = ?", (url,))
+
+
+@awaitable_on(DB_EXECUTOR)
+def create_product(url, details, first_reviews_url, review_limit):
+    """Insert a product with its initial scrape checkpoint, returning its product_id.
+
+    details are what is known before enrichment (services.scraper.DEFAULT_PRODUCT_DETAILS).
+
+    Returns None if the URL is already stored (another worker may have inserted it).
+    """
+    conn = get_db()
+    try:
+        # OR IGNORE: single-flight is per process, so another worker may have inserted it meanwhile
+        cursor = conn.execute("""
+            INSERT OR IGNORE INTO products (product_name, product_url, product_image, product_price)
+            VALUES (?, ?, ?, ?)
+        """, (
+            details["product_name"],
+            url,
+            details["product_image"],
+            details["product_price"]
+        ))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return None
+
+        product_id = conn.execute("SELECT product_id FROM products WHERE product_url = ?", (url,)).fetchone()["product_id"]
+        save_checkpoint(conn, product_id, url, first_reviews_url, 0, 0, review_limit)
+        conn.commit()
+        return product_id
+    finally:
+        conn.close()
+
+
+@awaitable_on(DB_EXECUTOR)
+def checkpoint_product_url(product_id):
+    row = _fetch_one("SELECT product_url FROM scrape_checkpoints WHERE product_id = ?", (product_id,))
+    return row["product_url"] if row else None
+
+
+@awaitable_on(DB_EXECUTOR)
+def unfinished_checkpoints():
+    return _fetch_all("""
+        SELECT c.*, p.product_name
+        FROM scrape_checkpoints c
+        LEFT JOIN products p ON c.product_id = p.product_id
+        WHERE c.status != 'completed'
+        ORDER BY c.updated_at DESC
+    """)
+
+
+@awaitable_on(DB_EXECUTOR)
+def reviews_with_products():
+    return _fetch_all("""
+        SELECT r.*, p.product_name, p.product_image, p.product_price
+        FROM reviews r
+        LEFT JOIN products p ON r.product_id = p.product_id
+        ORDER BY r.id DESC
+    """)
+
+
+@awaitable_on(DB_EXECUTOR)
+def products_with_review_counts():
+    return _fetch_all("""
+        SELECT p.*, COUNT(r.id) as review_count
+        FROM products p
+        LEFT JOIN reviews r ON p.product_id = r.product_id
+        GROUP BY p.product_id
+        ORDER BY p.id DESC
+    """)
+
+
+@awaitable_on(DB_EXECUTOR)
+def latest_product_reviews(product_id, limit=25):
+    return _fetch_all("""
+        SELECT review_title, review_text, rating, sentiment, polarity, created_at
+        FROM reviews
+        WHERE product_id = ?
+        ORDER BY id DESC
+        LIMIT ?
+    """, (product_id, limit))
+
+
+@awaitable_on(DB_EXECUTOR)
+def daily_rollups(product_id, start, end):
+    """Rollup rows for aggregate_trends; all products summed per day when product_id is None"""
+    conn = get_db()
+    try:
+        # Explicit bounds keep both queries on an index range scan: (product_id, day) or (day)
+        params = {"product_id": product_id, "start": start, "end": end}
+        if product_id:
+            cursor = conn.execute("""
+                SELECT day, review_count, rating_sum, polarity_sum, polarity_sq_sum,
+                       positive_count, neutral_count, negative_count
+                FROM review_daily_rollups
+                WHERE product_id = :product_id AND day BETWEEN :start AND :end
+                ORDER BY day
+            """, params)
+        else:
+            # Sum the rollups of all products per day
+            cursor = conn.execute("""
+                SELECT day, SUM(review_count), SUM(rating_sum), SUM(polarity_sum), SUM(polarity_sq_sum),
+                       SUM(positive_count), SUM(neutral_count), SUM(negative_count)
+                FROM review_daily_rollups
+                WHERE day BETWEEN :start AND :end
+                GROUP BY day
+                ORDER BY day
+            """, params)
+        return [tuple(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+@awaitable_on(DB_EXECUTOR)
+def product_names_with_counts():
+    return _fetch_all("""
+        SELECT p.product_id, p.product_name, COUNT(r.id) as review_count
+        FROM products p
+        LEFT JOIN reviews r ON p.product_id = r.product_id
+        GROUP BY p.product_id
+        ORDER BY p.id DESC
+    """)
+
+
+@awaitable_on(DB_EXECUTOR)
+def products_by_ids(product_ids):
+    placeholders = ",".join("?" * len(product_ids))
+    return _fetch_all(f"""
+        SELECT product_id, product_name, product_url, product_image, product_price
+        FROM products
+        WHERE product_id IN ({placeholders})
+    """, tuple(product_ids))
+
+
+@awaitable_on(DB_EXECUTOR)
+def review_columns_by_product(product_ids):
+    """(product_id, rating, polarity, text length, sentiment code) tuples ordered by product"""
+    placeholders = ",".join("?" * len(product_ids))
+    conn = get_db()
+    try:
+        # One ordered pass over the reviews of all requested products (idx_reviews_product)
+        return [tuple(row) for row in conn.execute(f"""
+            SELECT product_id, rating, polarity, length(review_text),
+                   CASE lower(sentiment) WHEN 'positive' THEN 1 WHEN 'neutral' THEN 2 WHEN 'negative' THEN 3 ELSE 0 END
+            FROM reviews
+            WHERE product_id IN ({placeholders})
+            ORDER BY product_id
+        """, tuple(product_ids)).fetchall()]
+    finally:
+        conn.close()
+
+
+@awaitable_on(DB_EXECUTOR)
+def review_fields(*columns):
+    """The given columns of every review, e.g. review_fields("rating", "review_text")"""
+    allowed = {"sentiment", "rating", "polarity", "review_text"}
+    if not set(columns) <= allowed:
+        raise ValueError(f"Unknown review columns: {sorted(set(columns) - allowed)}")
+    return _fetch_all(f"SELECT {', '.join(columns)} FROM reviews")
+
+
+@awaitable_on(DB_EXECUTOR)
+def all_reviews():
+    return _fetch_all("SELECT * FROM reviews")
+
+
+@awaitable_on(DB_EXECUTOR)
+def database_summary():
+    conn = get_db()
+    try:
+        # Check products
+        products = conn.execute("SELECT product_id, product_name FROM products LIMIT 5").fetchall()
+        # Check reviews
+        reviews = conn.execute("SELECT product_id, review_title FROM reviews LIMIT 5").fetchall()
+        # Count reviews
+        review_count = conn.execute("SELECT COUNT(*) as count FROM reviews").fetchone()
+        return {
+            "products": [dict(p) for p in products],
+            "reviews": [dict(r) for r in reviews],
+            "total_reviews": review_count["count"]
+        }
+    finally:
+        conn.close()
+
+
+@awaitable_on(DB_EXECUTOR)
+def clear_all():
+    conn = get_db()
+    try:
+        conn.execute("DELETE FROM reviews")
+        conn.execute("DELETE FROM products")
+        conn.execute("DELETE FROM review_daily_rollups")
+        conn.execute("DELETE FROM scrape_checkpoints")
+        conn.execute("DELETE FROM retention_policies")
+        conn.execute("DELETE FROM product_details_state")
+        conn.execute("DELETE FROM product_price_history")
+        conn.commit()
+    finally:
+        conn.close()
+    clear_archives()
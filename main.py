@@ -1,38 +1,275 @@
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, Response
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import FastAPI, Request, Form, HTTPException, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, Response, PlainTextResponse, FileResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
-from configs.database import init_db, get_db
-from services.scraper import scrape_reviews, extract_product_details
-from services.sentiment import analyze_sentiment
+import logging
+import os
+import threading
+import time
+
+from configs.database import init_db
+from configs import repository
+from configs.repository import run_db, run_db_background
+from configs.logger import setup_logging
+from services.metrics import (
+    render_metrics,
+    REQUEST_SECONDS,
+    DB_ROWS_INSERTED
+)
+from services.scraper import scrape_reviews, canonicalize_product_url, reviews_url, DEFAULT_PRODUCT_DETAILS
+from services.marketplaces import get_registry
+from services.singleflight import join_or_start, in_flight_keys
+from services.cache import memoize_on_data_version
+from services.executors import ExecutorBusy, RENDER_EXECUTOR
+from services.page_cache import RenderedPage
+from services.review_store import get_store
+from services.trends import aggregate_trends
+from services.profiler import SamplingProfiler, should_profile, save_profile, list_profiles, profile_path, is_allowed_client, request_started, request_finished
+from services import enrichment, plots, retention, sentiment
+from services.ingest import analyze_reviews, store_reviews, prefetch, set_checkpoint_status, claim_checkpoint
 from services.stats import calculate_stats, calculate_correlations, calculate_detailed_sentiment_distribution, calculate_advanced_metrics, get_sentiment_by_rating
+from services.stats import calculate_grouped_metrics, calculate_metrics_from_columns
 from services.plots import (
     generate_review_length_plot, 
     generate_sentiment_polarity_plot,
     generate_length_by_rating_plot,
-    generate_rating_spread_plot
+    generate_rating_spread_plot,
+    render_review_lengths,
+    render_polarities,
+    render_lengths_by_rating,
+    render_rating_spread,
+    lengths_by_star
 )
 
+setup_logging()
+logger = logging.getLogger("main")
+
+# matplotlib, TextBlob/nltk and scipy are imported lazily; pre-warm them in the background after startup
+PREWARM_IMPORTS = os.environ.get("PREWARM_IMPORTS", "1") == "1"
+
 app = FastAPI()
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="template")
 
 
+@app.exception_handler(ExecutorBusy)
+async def executor_busy(request: Request, exc: ExecutorBusy):
+    # Shed load rather than queue without bound behind a saturated executor
+    logger.warning("Rejected %s %s: %s", request.method, request.url.path, exc)
+    return JSONResponse({"detail": "Server busy, retry shortly"}, status_code=503, headers={"Retry-After": "1"})
+
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, so /api/product-reviews/{product_id} stays one series
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status
+        )
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    # Opt-in per request (X-Profile: 1 or ?profile=1 from an allowed client) or PROFILE_SAMPLE_RATE.
+    # Streaming responses are profiled until their headers are sent. Every request is
+    # counted so a profile can report how many others ran alongside it.
+    request_started()
+    try:
+        if not should_profile(request):
+            return await call_next(request)
+
+        profiler = SamplingProfiler()
+        profiler.start()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            profiler.stop()
+            profile_id = await run_in_threadpool(save_profile, profiler, request, status, len(in_flight_keys()))
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+    finally:
+        request_finished()
+
+
+def _prewarm():
+    start = time.perf_counter()
+    try:
+        plots.warm_up()
+        sentiment.warm_up()
+    except Exception:
+        logger.exception("Pre-warming heavy imports failed")
+        return
+    logger.info("Pre-warmed plotting and sentiment imports in %.0f ms", (time.perf_counter() - start) * 1000)
+
+
+def _load_review_store(store):
+    try:
+        store.refresh()
+    except Exception:
+        logger.exception("Loading the review store failed")
+        return
+    logger.info("Review store loaded: %s", store.info())
+
+
 @app.on_event("startup")
 def startup():
     init_db()
+    if PREWARM_IMPORTS:
+        threading.Thread(target=_prewarm, name="prewarm", daemon=True).start()
+    store = get_store()
+    if store is not None:
+        threading.Thread(target=_load_review_store, args=(store,), name="review-store", daemon=True).start()
+    retention.start_background()
+    enrichment.start_background()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    retention.stop_background()
+    enrichment.stop_background()
 
 
 @app.get("/", response_class=HTMLResponse)
-def index(request: Request):
+async def index(request: Request):
     return templates.TemplateResponse("index.jinja2", {"request": request})
 
 
 import json
 import asyncio
 
+# Reviews scraped per product unless the request asks for more
+SCRAPE_REVIEW_LIMIT = 100
+SCRAPE_MAX_REVIEW_LIMIT = int(os.environ.get("SCRAPE_MAX_REVIEW_LIMIT", "5000"))
+
+
+def _parse_review_limit(value):
+    """The requested review limit, or None if it is not a number between 1 and SCRAPE_MAX_REVIEW_LIMIT"""
+    if not value:
+        return SCRAPE_REVIEW_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        return None
+    return limit if 1 <= limit <= SCRAPE_MAX_REVIEW_LIMIT else None
+
+
+async def _scrape_pages(url, product_id, checkpoint):
+    """Scrape onwards from a checkpoint, committing each page together with the next checkpoint"""
+    limit = checkpoint["review_limit"]
+    scraped = checkpoint["review_count"]
+    stored = 0
+    events = scrape_reviews(
+        url=url, product_id=product_id, limit=limit,
+        start_url=checkpoint["next_url"], start_count=scraped, start_page=checkpoint["pages_done"] + 1,
+        start_offset=checkpoint["next_offset"]
+    )
+
+    # Each page is analyzed and committed while the scraper fetches the next one
+    async for event in prefetch(events):
+        if event["type"] == "progress":
+            yield json.dumps(event) + "\n"
+        elif event["type"] == "error":
+            # Pages already committed are kept; the checkpoint points at the page that failed
+            await run_db_background(set_checkpoint_status, product_id, "interrupted", event["message"])
+            logger.warning("Scrape of %s interrupted after %d reviews: %s", url, scraped, event["message"])
+            if not scraped:
+                yield json.dumps(event) + "\n"
+            else:
+                yield json.dumps({
+                    "type": "completed",
+                    "resumable": True,
+                    "message": f"Saved {scraped} reviews, then stopped: {event['message']} Submit the URL again to resume."
+                }) + "\n"
+            return
+        elif event["type"] == "page":
+            page = event["page"]
+            yield json.dumps({"type": "progress", "stage": "sentiment", "page": page, "count": scraped, "total": limit, "message": f"Analyzing sentiment of page {page}..."}) + "\n"
+            rows = await asyncio.to_thread(analyze_reviews, event["reviews"])
+            scraped += len(event["reviews"])
+            await run_db_background(store_reviews, rows, {
+                "product_id": product_id,
+                "product_url": url,
+                "next_url": event["next_url"],
+                "next_offset": event["next_offset"],
+                # A page cut short by the limit is not done; resuming continues on it
+                "pages_done": page if not event["next_offset"] else page - 1,
+                "review_count": scraped,
+                "review_limit": limit
+            })
+            stored += len(rows)
+            yield json.dumps({"type": "progress", "stage": "store", "page": page, "count": scraped, "total": limit, "message": f"Saved {scraped} reviews..."}) + "\n"
+
+    await run_db_background(set_checkpoint_status, product_id, "completed")
+    logger.info("Successfully saved %d reviews for %s (%d in total)", stored, url, scraped)
+
+    completion_msg = "Analysis complete!"
+    if not scraped:
+        completion_msg = "Product saved (no reviews found)."
+    yield json.dumps({"type": "completed", "message": completion_msg}) + "\n"
+
+
+async def _scrape_events(url, limit):
+    """NDJSON progress for scraping a new product, or resuming an existing product's unfinished scrape"""
+    # Set once this scrape owns the product's checkpoint, which must not be left 'running' on failure
+    product_id = None
+    try:
+         # Check if product already exists
+        existing_product = await repository.product_by_url(url)
+        
+        if existing_product:
+            checkpoint = await run_db(claim_checkpoint, existing_product["product_id"], limit)
+            if checkpoint is None:
+                logger.info("Product already exists: %s", existing_product["product_name"])
+                yield json.dumps({"type": "completed", "message": "Product already exists"}) + "\n"
+                return
+            product_id = existing_product["product_id"]
+            logger.info("Resuming scrape of %s at page %d with %d reviews", url, checkpoint["pages_done"] + 1, checkpoint["review_count"])
+        else:
+            # Committed before scraping so no write lock is held while pages download
+            checkpoint = {"next_url": reviews_url(url), "next_offset": 0, "pages_done": 0, "review_count": 0, "review_limit": limit}
+            product_id = await repository.create_product(url, DEFAULT_PRODUCT_DETAILS, checkpoint["next_url"], limit)
+            if product_id is None:
+                logger.info("Product was added by another worker: %s", url)
+                yield json.dumps({"type": "completed", "message": "Product already exists"}) + "\n"
+                return
+            DB_ROWS_INSERTED.inc(1, table="products")
+            
+            logger.info("Product saved with ID: %s", product_id)
+            # Name, image and price are fetched by the enrichment stage while the reviews download
+            enrichment.schedule_product(product_id, url)
+
+        async for line in _scrape_pages(url, product_id, checkpoint):
+            yield line
+
+    except Exception as e:
+        logger.exception("Error in streaming scrape for %s", url)
+        if product_id is not None:
+            # Release the checkpoint so resubmitting the URL or /resume can continue right away
+            try:
+                await run_db_background(set_checkpoint_status, product_id, "interrupted", str(e))
+            except Exception:
+                logger.exception("Could not mark the scrape of %s as interrupted", url)
+        yield json.dumps({"type": "error", "message": f"{str(e)} ({type(e).__name__})"}) + "\n"
+
+
 @app.post("/api/scrape")
 async def scrape_stream(request: Request):
     form = await request.form()
@@ -41,303 +278,384 @@ async def scrape_stream(request: Request):
     if not url:
          return Response(json.dumps({"error": "URL is required"}), media_type="application/json")
 
-    # Fix URL if it doesn't have protocol
-    if not url.startswith(('http://', 'https://')):
-        url = 'https://' + url
-            
-    print(f"Starting analysis for URL: {url}")
+    limit = _parse_review_limit(form.get("limit"))
+    if limit is None:
+        return Response(json.dumps({"error": f"limit must be between 1 and {SCRAPE_MAX_REVIEW_LIMIT}"}), media_type="application/json")
 
-    async def event_generator():
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        try:
-             # Check if product already exists
-            cursor.execute("SELECT product_id, product_name FROM products WHERE product_url = ?", (url,))
-            existing_product = cursor.fetchone()
+    # Fix URL if it doesn't have protocol and collapse /dp/, /product-reviews/ and query-string variants
+    url = canonicalize_product_url(url)
             
-            if existing_product:
-                print(f"Product already exists: {existing_product['product_name']}")
-                yield json.dumps({"type": "completed", "message": "Product already exists"}) + "\n"
-                return
+    logger.info("Starting analysis for URL: %s", url)
 
-            yield json.dumps({"type": "progress", "count": 0, "total": 100, "message": "Extracting product details..."}) + "\n"
-            
-            # Extract product details
-            product_details = extract_product_details(url)
-            
-            # Insert product into database
-            cursor.execute("""
-                INSERT INTO products (product_name, product_url, product_image, product_price)
-                VALUES (?, ?, ?, ?)
-            """, (
-                product_details["product_name"],
-                product_details["product_url"],
-                product_details["product_image"],
-                product_details["product_price"]
-            ))
-            
-            # Get the product_id of the inserted product
-            cursor.execute("SELECT product_id FROM products WHERE product_url = ?", (url,))
-            product_record = cursor.fetchone()
-            product_id = product_record["product_id"]
-            
-            print(f"Product saved with ID: {product_id}")
-            
-            # Scrape reviews
-            reviews_generator = scrape_reviews(url=url, product_id=product_id, limit=100)
-            
-            raw_reviews = []
-            async for event in reviews_generator:
-                if event["type"] == "progress":
-                    yield json.dumps(event) + "\n"
-                elif event["type"] == "result":
-                    raw_reviews = event["reviews"]
-
-            if not raw_reviews:
-                 print("⚠️ No reviews found. Saving product details only.")
-                 yield json.dumps({"type": "progress", "count": 0, "total": 0, "message": "No reviews found. Saving product details only..."}) + "\n"
-            else:
-                yield json.dumps({"type": "progress", "count": len(raw_reviews), "total": 100, "message": "Creating sentiment analysis..."}) + "\n"
-
-            saved_count = 0
-            for r in raw_reviews:
-                try:
-                    sentiment, polarity = analyze_sentiment(r["review_text"])
-                    
-                    cursor.execute("""
-                        INSERT INTO reviews (product_id, review_title, review_text, rating, sentiment, polarity)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        r["product_id"],
-                        r["review_title"],
-                        r["review_text"],
-                        r["rating"],
-                        sentiment,
-                        polarity
-                    ))
-                    saved_count += 1
-                    
-                except Exception as e:
-                    print(f"Error saving review: {str(e)}")
-                    continue
-            
-            conn.commit()
-            print(f"Successfully saved product and {saved_count} reviews to database")
-            
-            completion_msg = "Analysis complete!"
-            if not raw_reviews:
-                completion_msg = "Product saved (no reviews found)."
-                
-            yield json.dumps({"type": "completed", "message": completion_msg}) + "\n"
-
-        except Exception as e:
-            print(f"Error in streaming scrape: {repr(e)}")
-            yield json.dumps({"type": "error", "message": f"{str(e)} ({type(e).__name__})"}) + "\n"
-        finally:
-            conn.close()
+    # Concurrent requests for the same product share one scrape and its progress stream
+    job = join_or_start(url, lambda: _scrape_events(url, limit))
+    return StreamingResponse(job.subscribe(), media_type="application/x-ndjson")
+
+
+@app.post("/api/scrape/{product_id}/resume")
+async def resume_scrape(product_id: str, limit: Optional[str] = Form(None)):
+    """Continue a product's interrupted scrape from its last checkpoint"""
+    review_limit = _parse_review_limit(limit)
+    if review_limit is None:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SCRAPE_MAX_REVIEW_LIMIT}")
+
+    url = await repository.checkpoint_product_url(product_id)
+    if url is None:
+        raise HTTPException(status_code=404, detail="No scrape checkpoint for this product")
+
+    job = join_or_start(url, lambda: _scrape_events(url, review_limit))
+    return StreamingResponse(job.subscribe(), media_type="application/x-ndjson")
+
+
+@app.get("/api/scrape/checkpoints")
+async def scrape_checkpoints():
+    """Scrapes that stopped before reaching their review limit"""
+    return {"checkpoints": await repository.unfinished_checkpoints(), "scrapes_in_flight": in_flight_keys()}
 
-    return StreamingResponse(event_generator(), media_type="application/x-ndjson")
 
 @app.post("/scrape")
-def scrape(
+async def scrape(
     url: str = Form(...)
 ):
     # Backward compatibility or fallback
     return RedirectResponse(url="/dashboard", status_code=303)
 
 
-@app.get("/reviews", response_class=HTMLResponse)
-def reviews_page(request: Request):
-    conn = get_db()
-    cursor = conn.cursor()
+def _render_template(name, **context):
+    # The templates do not use the request, so a rendered page can be shared by every request
+    return templates.get_template(name).render(**context)
 
-    cursor.execute("""
-        SELECT r.*, p.product_name, p.product_image, p.product_price 
-        FROM reviews r 
-        LEFT JOIN products p ON r.product_id = p.product_id 
-        ORDER BY r.id DESC
-    """)
-    reviews = cursor.fetchall()
 
-    conn.close()
+@memoize_on_data_version()
+def _reviews_page():
+    reviews = repository.reviews_with_products.sync()
+    return RenderedPage("reviews", _render_template("reviews.jinja2", reviews=reviews))
 
-    return templates.TemplateResponse("reviews.jinja2", {"request": request, "reviews": reviews})
 
+@app.get("/reviews", response_class=HTMLResponse)
+async def reviews_page(request: Request):
+    page = await RENDER_EXECUTOR.run(_reviews_page)
+    return page.response(request)
 
-@app.get("/products", response_class=HTMLResponse)
-def products_page(request: Request):
-    conn = get_db()
-    cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT p.*, COUNT(r.id) as review_count 
-        FROM products p 
-        LEFT JOIN reviews r ON p.product_id = r.product_id 
-        GROUP BY p.product_id 
-        ORDER BY p.id DESC
-    """)
-    products = cursor.fetchall()
+@memoize_on_data_version()
+def _products_page():
+    products = repository.products_with_review_counts.sync()
+    return RenderedPage("products", _render_template("products.jinja2", products=products))
 
-    conn.close()
 
-    return templates.TemplateResponse("products.jinja2", {"request": request, "products": products})
+@app.get("/products", response_class=HTMLResponse)
+async def products_page(request: Request):
+    page = await RENDER_EXECUTOR.run(_products_page)
+    return page.response(request)
 
 @app.get("/api/product-reviews/{product_id}")
-def get_product_reviews(product_id: str):
-    print(f"API called for product_id: {product_id}")
-    conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT review_title, review_text, rating, sentiment, polarity, created_at
-        FROM reviews 
-        WHERE product_id = ? 
-        ORDER BY id DESC
-        LIMIT 25
-    """, (product_id,))
-    
-    rows = cursor.fetchall()
-    print(f"Found {len(rows)} reviews for product_id: {product_id}")
-    
-    reviews = [{
-        "review_title": row["review_title"],
-        "review_text": row["review_text"],
-        "rating": row["rating"],
-        "sentiment": row["sentiment"],
-        "polarity": row["polarity"],
-        "created_at": row["created_at"]
-    } for row in rows]
-    
-    conn.close()
-    print(f"Returning {len(reviews)} reviews")
+async def get_product_reviews(product_id: str):
+    logger.debug("API called for product_id: %s", product_id)
+    reviews = await repository.latest_product_reviews(product_id)
+    logger.debug("Found %d reviews for product_id: %s", len(reviews), product_id)
     return reviews
 
+@app.get("/api/trends")
+async def get_trends(
+    product_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: Literal["day", "week", "month"] = "day",
+    window: int = Query(7, ge=1, le=365)
+):
+    """Sentiment and rating over time, served from the daily rollups"""
+    rows = await repository.daily_rollups(
+        product_id,
+        start.isoformat() if start else "0000-01-01",
+        end.isoformat() if end else "9999-12-31"
+    )
+
+    return {
+        "product_id": product_id,
+        "granularity": granularity,
+        "window": window,
+        "series": aggregate_trends(rows, granularity, window)
+    }
+
+
+@app.delete("/api/products/{product_id}")
+async def delete_product(product_id: str):
+    """Delete a product with its reviews, rollups, checkpoint, retention policy and archives"""
+    deleted = await run_db(retention.delete_product, product_id)
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"product_id": product_id, "reviews_deleted": deleted}
+
+
+@app.post("/api/products/refresh", status_code=202)
+async def refresh_products(ids: Optional[str] = Form(None), limit: int = Form(enrichment.ENRICH_BATCH_SIZE)):
+    """Refresh product names, images and prices in the background (all products round robin, or ids)"""
+    product_ids = _parse_product_ids(ids)
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    if not enrichment.start_refresh(product_ids, limit):
+        raise HTTPException(status_code=409, detail="A product refresh is already running")
+    return enrichment.refresh_status()
+
+
+@app.get("/api/products/refresh")
+async def product_refresh_status():
+    return enrichment.refresh_status()
+
+
+@app.get("/api/products/{product_id}/prices")
+async def get_price_history(product_id: str):
+    return {"product_id": product_id, "prices": await run_db(enrichment.price_history, product_id)}
+
+
+@app.get("/api/products/{product_id}/archive")
+async def get_archived_reviews(
+    product_id: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(100, ge=1, le=10000)
+):
+    """Reviews retention moved to the archive, most recently stored first"""
+    reviews = await run_db(
+        retention.query_archive, product_id,
+        start.isoformat() if start else None,
+        end.isoformat() if end else None,
+        limit
+    )
+    return {"product_id": product_id, "reviews": reviews}
+
+
+@app.get("/api/retention")
+async def get_retention():
+    return await run_db(retention.retention_summary)
+
+
+@app.put("/api/retention/{product_id}")
+async def set_retention_policy(
+    product_id: str,
+    max_age_days: Optional[int] = Form(None),
+    keep_latest: Optional[int] = Form(None)
+):
+    """Override the default retention for one product; an omitted field keeps the default"""
+    if any(value is not None and value < 0 for value in (max_age_days, keep_latest)):
+        raise HTTPException(status_code=400, detail="max_age_days and keep_latest must be 0 (no limit) or more")
+    if not await run_db(retention.set_policy, product_id, max_age_days, keep_latest):
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"product_id": product_id, "max_age_days": max_age_days, "keep_latest": keep_latest}
+
+
+@app.post("/api/retention/run")
+async def apply_retention_now(full_vacuum: bool = Form(False)):
+    """Apply retention now. full_vacuum rebuilds the file once so an older database can vacuum incrementally."""
+    result = await run_db(retention.run_retention)
+    if full_vacuum:
+        await run_db(retention.full_vacuum)
+    return result
+
+
+MAX_COMPARE_PRODUCTS = 10
+
+
+def _parse_product_ids(ids):
+    """Comma-separated product ids, de-duplicated in order"""
+    return tuple(dict.fromkeys(pid.strip() for pid in (ids or "").split(",") if pid.strip()))
+
+
+@memoize_on_data_version()
+def _compare_products(product_ids):
+    # numpy stays out of app startup (see benchmarks/import_budget.py)
+    import numpy as np
+
+    products = {row["product_id"]: row for row in repository.products_by_ids.sync(product_ids)}
+    rows = repository.review_columns_by_product.sync(product_ids)
+
+    columns = list(zip(*rows)) if rows else [(), (), (), (), ()]
+    metrics = calculate_grouped_metrics(
+        np.array(columns[0], dtype=object),
+        np.array(columns[1], dtype=np.float64),
+        np.array(columns[2], dtype=np.float64),
+        np.array(columns[3], dtype=np.float64),
+        np.array(columns[4], dtype=np.uint8)
+    )
+    no_reviews = calculate_metrics_from_columns([], [], [], [])
+    return [dict(products[pid], **metrics.get(pid, no_reviews)) for pid in product_ids if pid in products]
+
+
+@app.get("/api/compare")
+async def compare_products(ids: str):
+    """Every dashboard metric for each of the comma-separated product ids, side by side"""
+    product_ids = _parse_product_ids(ids)
+    if not product_ids or len(product_ids) > MAX_COMPARE_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"Pass between 1 and {MAX_COMPARE_PRODUCTS} product ids")
+    comparison = await RENDER_EXECUTOR.run(_compare_products, product_ids)
+    if not comparison:
+        raise HTTPException(status_code=404, detail="No matching products")
+    return {"products": comparison}
+
+
+@memoize_on_data_version()
+def _compare_page(selected_ids):
+    return RenderedPage("compare", _render_template(
+        "compare.jinja2",
+        all_products=repository.product_names_with_counts.sync(),
+        selected_ids=selected_ids,
+        max_products=MAX_COMPARE_PRODUCTS,
+        comparison=_compare_products(selected_ids) if selected_ids else []
+    ))
+
+
+@app.get("/compare", response_class=HTMLResponse)
+async def compare_page(request: Request, ids: Optional[str] = None):
+    selected_ids = _parse_product_ids(ids)[:MAX_COMPARE_PRODUCTS]
+    page = await RENDER_EXECUTOR.run(_compare_page, selected_ids)
+    return page.response(request)
+
+
 @app.get("/api/reviews")
-def get_all_reviews():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM reviews")
-    rows = cursor.fetchall()
-    conn.close()
-    
-    reviews = [dict(row) for row in rows]
-    return reviews
+async def get_all_reviews():
+    return await repository.all_reviews()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/debug/database")
-def debug_database():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Check products
-    cursor.execute("SELECT product_id, product_name FROM products LIMIT 5")
-    products = cursor.fetchall()
-    
-    # Check reviews
-    cursor.execute("SELECT product_id, review_title FROM reviews LIMIT 5")
-    reviews = cursor.fetchall()
-    
-    # Count reviews
-    cursor.execute("SELECT COUNT(*) as count FROM reviews")
-    review_count = cursor.fetchone()
-    
-    conn.close()
-    
+async def debug_database():
+    store = get_store()
+    return {
+        **await repository.database_summary(),
+        "scrapes_in_flight": in_flight_keys(),
+        "review_store": store.info() if store is not None else None,
+        "executors": {"db": repository.DB_EXECUTOR.info(), "render": RENDER_EXECUTOR.info()}
+    }
+
+
+@app.get("/debug/marketplaces")
+async def debug_marketplaces():
+    registry = get_registry()
+    return {
+        "default": registry.default.name,
+        "profiles": {name: profile.info() for name, profile in registry.profiles.items()}
+    }
+
+
+@app.get("/debug/profiles")
+async def debug_profiles(request: Request):
+    if not is_allowed_client(request):
+        raise HTTPException(status_code=403, detail="Profiles are only available to allowed clients")
+    return {"profiles": await asyncio.to_thread(list_profiles)}
+
+
+@app.get("/debug/profiles/{profile_id}")
+async def debug_profile(request: Request, profile_id: str, format: str = "speedscope"):
+    if not is_allowed_client(request):
+        raise HTTPException(status_code=403, detail="Profiles are only available to allowed clients")
+    path = profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/json" if format == "speedscope" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
+
+@memoize_on_data_version()
+def _dashboard_metrics():
+    store = get_store()
+    if store is not None:
+        columns = store.snapshot()
+        return calculate_metrics_from_columns(columns.ratings_as_float(), columns.polarities_as_float(), columns.length, columns.sentiment)
+
+    reviews = repository.review_fields.sync("sentiment", "rating", "polarity", "review_text")
     return {
-        "products": [dict(p) for p in products],
-        "reviews": [dict(r) for r in reviews],
-        "total_reviews": dict(review_count)["count"]
+        "stats": calculate_stats(reviews),
+        "correlations": calculate_correlations(reviews),
+        "detailed_sentiment": calculate_detailed_sentiment_distribution(reviews),
+        "advanced_metrics": calculate_advanced_metrics(reviews),
+        # Calculate sentiment by rating for charts
+        "sentiment_by_rating": get_sentiment_by_rating(reviews)
     }
 
 
+@memoize_on_data_version()
+def _dashboard_page():
+    return RenderedPage("dashboard", _render_template("dashboard.jinja2", **_dashboard_metrics()))
+
+
 @app.get("/dashboard", response_class=HTMLResponse)
-def dashboard(request: Request):
-    conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT r.sentiment, r.rating, r.polarity, r.review_text, p.product_name 
-        FROM reviews r 
-        LEFT JOIN products p ON r.product_id = p.product_id
-    """)
-    rows = cursor.fetchall()
-
-    conn.close()
-
-    reviews = [{"sentiment": r["sentiment"], "rating": r["rating"], "polarity": r["polarity"], "review_text": r["review_text"]} for r in rows]
-    stats = calculate_stats(reviews)
-    correlations = calculate_correlations(reviews)
-    detailed_sentiment = calculate_detailed_sentiment_distribution(reviews)
-    advanced_metrics = calculate_advanced_metrics(reviews)
-
-    # Calculate sentiment by rating for charts
-    sentiment_by_rating = get_sentiment_by_rating(reviews)
-
-    return templates.TemplateResponse("dashboard.jinja2", {
-        "request": request, 
-        "stats": stats, 
-        "correlations": correlations,
-        "detailed_sentiment": detailed_sentiment,
-        "advanced_metrics": advanced_metrics,
-        "sentiment_by_rating": sentiment_by_rating
-    })
+async def dashboard(request: Request):
+    page = await RENDER_EXECUTOR.run(_dashboard_page)
+    return page.response(request)
 
 
 @app.get("/clear")
-def clear_db():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM reviews")
-    cursor.execute("DELETE FROM products")
-    conn.commit()
-    conn.close()
+async def clear_db():
+    await repository.clear_all()
 
     return RedirectResponse(url="/", status_code=303)
 
 
+@memoize_on_data_version()
+def _review_length_png():
+    store = get_store()
+    if store is not None:
+        lengths = store.snapshot().length
+        return render_review_lengths(lengths[lengths > 0]).getvalue()
+
+    reviews = repository.review_fields.sync("review_text")
+    return generate_review_length_plot(reviews).getvalue()
+
+
 @app.get("/plots/review_length")
-def plot_review_length():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT review_text FROM reviews")
-    reviews = [{"review_text": row["review_text"]} for row in cursor.fetchall()]
-    conn.close()
-    
-    img = generate_review_length_plot(reviews)
-    return Response(content=img.getvalue(), media_type="image/png")
+async def plot_review_length():
+    return Response(content=await RENDER_EXECUTOR.run(_review_length_png), media_type="image/png")
+
+
+@memoize_on_data_version()
+def _sentiment_polarity_png():
+    store = get_store()
+    if store is not None:
+        import numpy as np
+        polarities = store.snapshot().polarities_as_float()
+        return render_polarities(polarities[~np.isnan(polarities)]).getvalue()
+
+    reviews = repository.review_fields.sync("polarity")
+    return generate_sentiment_polarity_plot(reviews).getvalue()
 
 
 @app.get("/plots/sentiment_polarity")
-def plot_sentiment_polarity():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT polarity FROM reviews")
-    reviews = [{"polarity": row["polarity"]} for row in cursor.fetchall()]
-    conn.close()
+async def plot_sentiment_polarity():
+    return Response(content=await RENDER_EXECUTOR.run(_sentiment_polarity_png), media_type="image/png")
+
+
+@memoize_on_data_version()
+def _length_by_rating_png():
+    store = get_store()
+    if store is not None:
+        columns = store.snapshot()
+        return render_lengths_by_rating(lengths_by_star(columns.rating, columns.length)).getvalue()
 
-    img = generate_sentiment_polarity_plot(reviews)
-    return Response(content=img.getvalue(), media_type="image/png")
+    reviews = repository.review_fields.sync("rating", "review_text")
+    return generate_length_by_rating_plot(reviews).getvalue()
 
 
 @app.get("/plots/length_by_rating")
-def plot_length_by_rating():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT rating, review_text FROM reviews")
-    reviews = [{"rating": row["rating"], "review_text": row["review_text"]} for row in cursor.fetchall()]
-    conn.close()
+async def plot_length_by_rating():
+    return Response(content=await RENDER_EXECUTOR.run(_length_by_rating_png), media_type="image/png")
+
+
+@memoize_on_data_version()
+def _rating_spread_png():
+    store = get_store()
+    if store is not None:
+        ratings = store.snapshot().rating
+        return render_rating_spread(ratings[ratings > 0]).getvalue()
+
+    reviews = repository.review_fields.sync("rating")
+    return generate_rating_spread_plot(reviews).getvalue()
 
-    img = generate_length_by_rating_plot(reviews)
-    return Response(content=img.getvalue(), media_type="image/png")
 
 @app.get("/plots/rating_spread")
-def plot_rating_spread():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT rating FROM reviews")
-    reviews = [{"rating": row["rating"]} for row in cursor.fetchall()]
-    conn.close()
-
-    img = generate_rating_spread_plot(reviews)
-    return Response(content=img.getvalue(), media_type="image/png")
+async def plot_rating_spread():
+    return Response(content=await RENDER_EXECUTOR.run(_rating_spread_png), media_type="image/png")
@@ -0,0 +1,43 @@
+import functools
+import threading
+from collections import OrderedDict
+
+from configs.database import data_version
+
+
+def memoize_on_data_version(maxsize=32):
+    """Memoize a function's results until the database changes.
+
+    Each worker process keeps its own cache; a commit from any worker changes
+    data_version() and invalidates every entry on that worker's next lookup.
+    """
+    def decorator(fn):
+        entries = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            version = data_version()
+            with lock:
+                entry = entries.get(args)
+                if entry is not None and entry[0] == version:
+                    entries.move_to_end(args)
+                    return entry[1]
+
+            # Computed outside the lock: concurrent misses may both compute, neither blocks the other
+            value = fn(*args)
+            with lock:
+                entries[args] = (version, value)
+                entries.move_to_end(args)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return value
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
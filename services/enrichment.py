@@ -0,0 +1,317 @@
+"""Product detail enrichment: keep names, images and prices current without rescraping reviews.
+
+Product pages are fetched concurrently (ENRICH_CONCURRENCY) under one token-bucket
+rate budget shared by every enrichment in the process. A refresh hashes the details
+it found and writes only when the hash differs from the stored one, so refreshing
+an unchanged catalog commits nothing and leaves every data-version cache valid.
+Price changes are appended to product_price_history.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+
+from configs.database import get_db
+from configs.repository import run_db_background
+from services.metrics import PRODUCTS_ENRICHED
+from services.scraper import DEFAULT_PRODUCT_DETAILS, fetch_product_details
+
+logger = logging.getLogger(__name__)
+
+# Product pages fetched per second across all enrichment in this process, with bursts of ENRICH_BURST
+ENRICH_REQUESTS_PER_SECOND = float(os.environ.get("ENRICH_REQUESTS_PER_SECOND", "0.5"))
+ENRICH_BURST = int(os.environ.get("ENRICH_BURST", "2"))
+ENRICH_CONCURRENCY = int(os.environ.get("ENRICH_CONCURRENCY", "4"))
+# Products refreshed per batch
+ENRICH_BATCH_SIZE = int(os.environ.get("ENRICH_BATCH_SIZE", "50"))
+# Seconds between background batches; 0 (the default) leaves refreshes to POST /api/products/refresh,
+# since every worker would otherwise fetch the same pages
+ENRICH_INTERVAL_SECONDS = int(os.environ.get("ENRICH_INTERVAL_SECONDS", "0"))
+
+_PRICE_NUMBER = re.compile(r"\d[\d,.\s]*")
+
+# Round-robin position of background batches (products.id)
+_cursor = 0
+_tasks = set()
+_refresh_task = None
+_last_refresh = None
+_background_task = None
+
+
+class RateBudget:
+    """Token bucket: acquire() waits until a request fits within rate per second"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+_budget = RateBudget(ENRICH_REQUESTS_PER_SECOND, ENRICH_BURST)
+
+
+def parse_price(text):
+    """Numeric value of a displayed price such as '₹24,999.', '$1,299.99' or '1.299,99 €'; None if there is none"""
+    match = _PRICE_NUMBER.search(text or "")
+    if not match:
+        return None
+    number = re.sub(r"\s", "", match.group(0)).rstrip(".,")
+    if "," in number and "." in number:
+        # Whichever separator comes last is the decimal point
+        if number.rfind(",") > number.rfind("."):
+            number = number.replace(".", "").replace(",", ".")
+        else:
+            number = number.replace(",", "")
+    elif "," in number:
+        # 24,999 and 1,29,999 group thousands; 12,50 has decimals
+        whole, _, fraction = number.rpartition(",")
+        number = number.replace(",", "") if len(fraction) == 3 else whole.replace(",", "") + "." + fraction
+    elif number.count(".") > 1:
+        number = number.replace(".", "")
+    try:
+        return float(number)
+    except ValueError:
+        return None
+
+
+def details_hash(details):
+    return hashlib.blake2b(
+        json.dumps([details[field] for field in DEFAULT_PRODUCT_DETAILS]).encode("utf-8"), digest_size=12
+    ).hexdigest()
+
+
+def _candidates(product_ids, limit):
+    """Products to refresh: the given ones, else never-enriched products first, then round robin"""
+    global _cursor
+    conn = get_db()
+    try:
+        if product_ids:
+            placeholders = ",".join("?" * len(product_ids))
+            return [dict(row) for row in conn.execute(
+                f"SELECT product_id, product_url FROM products WHERE product_id IN ({placeholders})", tuple(product_ids)
+            )]
+
+        rows = [dict(row) for row in conn.execute("""
+            SELECT p.product_id, p.product_url
+            FROM products p
+            LEFT JOIN product_details_state s ON p.product_id = s.product_id
+            WHERE s.product_id IS NULL
+            ORDER BY p.id
+            LIMIT ?
+        """, (limit,))]
+        if len(rows) < limit:
+            seen = {row["product_id"] for row in rows}
+            batch = conn.execute("""
+                SELECT id, product_id, product_url FROM products WHERE id > ? ORDER BY id LIMIT ?
+            """, (_cursor, limit - len(rows))).fetchall()
+            # Wrap around to the start of the catalog
+            if len(batch) < limit - len(rows):
+                batch += conn.execute("""
+                    SELECT id, product_id, product_url FROM products WHERE id <= ? ORDER BY id LIMIT ?
+                """, (_cursor, limit - len(rows) - len(batch))).fetchall()
+            if batch:
+                _cursor = batch[-1]["id"]
+            rows += [
+                {"product_id": row["product_id"], "product_url": row["product_url"]}
+                for row in batch if row["product_id"] not in seen
+            ]
+        return rows
+    finally:
+        conn.close()
+
+
+def _stored_details(product_id):
+    conn = get_db()
+    try:
+        row = conn.execute("""
+            SELECT p.product_name, p.product_image, p.product_price, s.details_hash
+            FROM products p
+            LEFT JOIN product_details_state s ON p.product_id = s.product_id
+            WHERE p.product_id = ?
+        """, (product_id,)).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def _save_details(product_id, details, new_hash, fetched_price):
+    """Store changed details and a price history row if the fetched price changed.
+
+    Returns False when there was nothing to write after all (another worker stored the
+    same details first, or the product was deleted meanwhile).
+    """
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        current = conn.execute("""
+            SELECT s.details_hash
+            FROM products p
+            LEFT JOIN product_details_state s ON p.product_id = s.product_id
+            WHERE p.product_id = ?
+        """, (product_id,)).fetchone()
+        if current is None or current["details_hash"] == new_hash:
+            conn.rollback()
+            return False
+
+        conn.execute("""
+            UPDATE products SET product_name = ?, product_image = ?, product_price = ?
+            WHERE product_id = ?
+        """, (details["product_name"], details["product_image"], details["product_price"], product_id))
+        conn.execute("""
+            INSERT INTO product_details_state (product_id, details_hash) VALUES (?, ?)
+            ON CONFLICT (product_id) DO UPDATE SET details_hash = excluded.details_hash, changed_at = CURRENT_TIMESTAMP
+        """, (product_id, new_hash))
+
+        if fetched_price is not None:
+            last = conn.execute("""
+                SELECT price, price_value FROM product_price_history WHERE product_id = ? ORDER BY observed_at DESC LIMIT 1
+            """, (product_id,)).fetchone()
+            value = parse_price(fetched_price)
+            # Compared by value, so the same price shown as '24,999.' or '₹24,999.00' is not a change
+            if value is not None:
+                changed = last is None or last["price_value"] != value
+            else:
+                changed = last is None or last["price"] != fetched_price
+            if changed:
+                conn.execute("""
+                    INSERT OR REPLACE INTO product_price_history (product_id, price, price_value) VALUES (?, ?, ?)
+                """, (product_id, fetched_price, value))
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+def price_history(product_id):
+    conn = get_db()
+    try:
+        return [dict(row) for row in conn.execute("""
+            SELECT observed_at, price, price_value
+            FROM product_price_history
+            WHERE product_id = ?
+            ORDER BY observed_at
+        """, (product_id,))]
+    finally:
+        conn.close()
+
+
+async def refresh_product(product_id, url):
+    """Fetch a product page and store its details if they changed; returns the outcome"""
+    await _budget.acquire()
+    try:
+        fetched = await asyncio.to_thread(fetch_product_details, url)
+    except Exception as e:
+        logger.warning("Enrichment of %s failed: %s", url, e)
+        PRODUCTS_ENRICHED.inc(outcome="failed")
+        return "failed"
+
+    try:
+        stored = await run_db_background(_stored_details, product_id)
+        if stored is None:
+            return "deleted"
+
+        # A field missing from this fetch keeps its stored value rather than reverting to the default
+        details = {
+            field: fetched[field] or stored[field] or default
+            for field, default in DEFAULT_PRODUCT_DETAILS.items()
+        }
+        new_hash = details_hash(details)
+        if new_hash == stored["details_hash"] or not await run_db_background(_save_details, product_id, details, new_hash, fetched["product_price"]):
+            outcome = "unchanged"
+        else:
+            outcome = "updated"
+            logger.info("Updated details of %s: %s, %s", product_id, details["product_name"], details["product_price"])
+    except Exception:
+        # e.g. a locked database: this product is retried in a later batch, the rest carry on
+        logger.exception("Storing details of %s failed", product_id)
+        outcome = "failed"
+    PRODUCTS_ENRICHED.inc(outcome=outcome)
+    return outcome
+
+
+async def refresh_products(product_ids=None, limit=ENRICH_BATCH_SIZE):
+    """Refresh a batch of products concurrently; returns the number of each outcome"""
+    global _last_refresh
+    start = time.perf_counter()
+    rows = await run_db_background(_candidates, product_ids, limit)
+    semaphore = asyncio.Semaphore(ENRICH_CONCURRENCY)
+
+    async def refresh(row):
+        async with semaphore:
+            return await refresh_product(row["product_id"], row["product_url"])
+
+    # One product's unexpected error must not abort the batch
+    outcomes = Counter()
+    for result in await asyncio.gather(*(refresh(row) for row in rows), return_exceptions=True):
+        if isinstance(result, BaseException):
+            logger.error("Product detail refresh failed: %r", result)
+            PRODUCTS_ENRICHED.inc(outcome="failed")
+            result = "failed"
+        outcomes[result] += 1
+    result = {"products": len(rows), **outcomes, "seconds": round(time.perf_counter() - start, 2)}
+    _last_refresh = {**result, "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    logger.info("Refreshed product details: %s", result)
+    return result
+
+
+def schedule_product(product_id, url):
+    """Enrich a newly added product in the background while its reviews are scraped"""
+    task = asyncio.get_running_loop().create_task(refresh_product(product_id, url))
+    # Keep a reference so the task is not garbage collected before it finishes
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def start_refresh(product_ids=None, limit=ENRICH_BATCH_SIZE):
+    """Start a refresh batch in the background; False if one is already running in this process"""
+    global _refresh_task
+    if _refresh_task is not None and not _refresh_task.done():
+        return False
+    _refresh_task = asyncio.get_running_loop().create_task(refresh_products(product_ids, limit))
+    return True
+
+
+def refresh_status():
+    return {"running": _refresh_task is not None and not _refresh_task.done(), "last": _last_refresh}
+
+
+async def _refresh_periodically(interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_products()
+        except Exception:
+            logger.exception("Product detail refresh failed")
+
+
+def start_background(interval=ENRICH_INTERVAL_SECONDS):
+    """Refresh a batch every interval seconds on the running event loop; no-op when interval is 0"""
+    global _background_task
+    if interval > 0 and _background_task is None:
+        _background_task = asyncio.get_running_loop().create_task(_refresh_periodically(interval))
+
+
+def stop_background():
+    global _background_task
+    if _background_task is not None:
+        _background_task.cancel()
+        _background_task = None
@@ -0,0 +1,84 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.metrics import EXECUTOR_QUEUE_SECONDS, EXECUTOR_REJECTED
+
+
+class ExecutorBusy(Exception):
+    """Raised instead of queueing when an executor already has max_pending calls"""
+
+
+class BoundedExecutor:
+    """A named thread pool whose queue of waiting calls is bounded.
+
+    run() awaits a blocking function on the pool. Once max_pending calls are queued or
+    running, further calls fail fast with ExecutorBusy instead of piling up, so one
+    slow kind of work cannot hold every request waiting behind it. run_background()
+    is for work that must not be shed (a scrape's page commits, enrichment writes):
+    it always queues, and counts towards the pending calls that requests see.
+    """
+
+    def __init__(self, name, threads, max_pending):
+        self.name = name
+        self.threads = threads
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=name)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    async def run(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                EXECUTOR_REJECTED.inc(executor=self.name)
+                raise ExecutorBusy(f"{self.name} executor has {self._pending} calls pending")
+            self._pending += 1
+        return await self._submit(fn, args, kwargs)
+
+    async def run_background(self, fn, *args, **kwargs):
+        """Like run(), but waits behind a full queue instead of raising ExecutorBusy"""
+        with self._lock:
+            self._pending += 1
+        return await self._submit(fn, args, kwargs)
+
+    async def _submit(self, fn, args, kwargs):
+        """Run fn on the pool for a call already counted in _pending"""
+        submitted = time.perf_counter()
+
+        def call():
+            EXECUTOR_QUEUE_SECONDS.observe(time.perf_counter() - submitted, executor=self.name)
+            return fn(*args, **kwargs)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, call)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def info(self):
+        with self._lock:
+            return {"threads": self.threads, "pending": self._pending, "max_pending": self.max_pending}
+
+
+def awaitable_on(executor):
+    """Decorator: make a blocking function awaitable on executor, keeping the blocking version as .sync"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await executor.run(fn, *args, **kwargs)
+
+        wrapper.sync = fn
+        return wrapper
+
+    return decorator
+
+
+# CPU-bound work (plots, dashboard statistics) kept off both the event loop and the DB threads
+RENDER_EXECUTOR = BoundedExecutor(
+    "render",
+    int(os.environ.get("RENDER_THREADS", "2")),
+    int(os.environ.get("RENDER_MAX_PENDING", "32"))
+)
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import os
+
+from configs.database import get_db
+from services.metrics import SENTIMENT_BATCH_SECONDS, SENTIMENT_REVIEWS, DB_INSERT_BATCH_SECONDS, DB_ROWS_INSERTED
+from services.sentiment import analyze_sentiment
+
+logger = logging.getLogger(__name__)
+
+# Parsed pages allowed to wait for analysis while the scraper fetches ahead
+PAGE_QUEUE_SIZE = int(os.environ.get("SCRAPE_PAGE_QUEUE_SIZE", "2"))
+# A 'running' checkpoint not updated for this long is treated as abandoned (e.g. the worker died)
+CHECKPOINT_LEASE_SECONDS = int(os.environ.get("SCRAPE_CHECKPOINT_LEASE_SECONDS", "120"))
+
+_END = object()
+
+
+def analyze_reviews(reviews):
+    """Score one page of scraped reviews, returning rows ready for store_reviews"""
+    rows = []
+    with SENTIMENT_BATCH_SECONDS.time():
+        for r in reviews:
+            try:
+                sentiment, polarity = analyze_sentiment(r["review_text"])
+            except Exception as e:
+                SENTIMENT_REVIEWS.inc(outcome="error")
+                logger.warning("Error analyzing review: %s", e)
+                continue
+            rows.append((
+                r["product_id"],
+                r["review_title"],
+                r["review_text"],
+                r["rating"],
+                sentiment,
+                polarity
+            ))
+    SENTIMENT_REVIEWS.inc(len(rows), outcome="ok")
+    return rows
+
+
+def save_checkpoint(conn, product_id, product_url, next_url, pages_done, review_count, review_limit, status="running", error=None, next_offset=0):
+    """Upsert a product's scrape checkpoint; the caller commits"""
+    conn.execute("""
+        INSERT INTO scrape_checkpoints (product_id, product_url, next_url, next_offset, pages_done, review_count, review_limit, status, error)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (product_id) DO UPDATE SET
+            next_url = excluded.next_url,
+            next_offset = excluded.next_offset,
+            pages_done = excluded.pages_done,
+            review_count = excluded.review_count,
+            review_limit = excluded.review_limit,
+            status = excluded.status,
+            error = excluded.error,
+            updated_at = CURRENT_TIMESTAMP
+    """, (product_id, product_url, next_url, next_offset, pages_done, review_count, review_limit, status, error))
+
+
+def set_checkpoint_status(product_id, status, error=None):
+    conn = get_db()
+    try:
+        conn.execute("""
+            UPDATE scrape_checkpoints SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE product_id = ?
+        """, (status, error, product_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def claim_checkpoint(product_id, review_limit):
+    """Take over a product's unfinished scrape, returning its checkpoint row or None.
+
+    Claimable when it was interrupted, when a finished scrape stopped at a lower limit
+    and has more pages, or when a 'running' one has not been updated within the lease.
+    The claim is a single UPDATE, so two workers cannot both resume the same scrape.
+    """
+    conn = get_db()
+    try:
+        row = conn.execute("""
+            UPDATE scrape_checkpoints
+            SET status = 'running', error = NULL, review_limit = max(review_limit, ?), updated_at = CURRENT_TIMESTAMP
+            WHERE product_id = ?
+              AND next_url IS NOT NULL
+              AND (status = 'interrupted'
+                   OR (status = 'completed' AND review_count < ?)
+                   OR (status = 'running' AND updated_at < datetime('now', ?)))
+            RETURNING product_id, product_url, next_url, next_offset, pages_done, review_count, review_limit
+        """, (review_limit, product_id, review_limit, f"-{CHECKPOINT_LEASE_SECONDS} seconds")).fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+def store_reviews(rows, checkpoint=None):
+    """Insert and commit one page of analyzed reviews in its own short transaction.
+
+    checkpoint, a dict of save_checkpoint arguments, is written in the same
+    transaction so the stored rows and the resume point can never disagree.
+    """
+    conn = get_db()
+    try:
+        with DB_INSERT_BATCH_SECONDS.time():
+            conn.executemany("""
+                INSERT INTO reviews (product_id, review_title, review_text, rating, sentiment, polarity)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+            if checkpoint is not None:
+                save_checkpoint(conn, **checkpoint)
+            conn.commit()
+    finally:
+        conn.close()
+    DB_ROWS_INSERTED.inc(len(rows), table="reviews")
+
+
+async def prefetch(events, maxsize=PAGE_QUEUE_SIZE):
+    """Iterate an async generator from a background task through a bounded queue.
+
+    The producer runs ahead of the consumer by up to maxsize items, so the next page
+    downloads while the current one is analyzed and stored, and stops when the queue
+    is full so memory stays bounded. The producer is cancelled if the consumer stops early.
+    """
+    queue = asyncio.Queue(maxsize=maxsize)
+
+    async def produce():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except asyncio.CancelledError:
+            await events.aclose()
+            raise
+        except Exception:
+            await queue.put(_END)
+            raise
+        await queue.put(_END)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            event = await queue.get()
+            if event is _END:
+                break
+            yield event
+        # Surface an exception raised by the producer
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
@@ -0,0 +1,239 @@
+"""Extraction profiles for the marketplaces the scraper understands, keyed by domain.
+
+Profiles live in configs/marketplaces.json (or the file named by MARKETPLACES_FILE):
+URL templates, fallback CSS selectors per field, pagination and block detection.
+Adding a marketplace is a new entry there. Selectors are compiled once when the
+registry loads, and hosts that match no profile use the default profile.
+
+A field's selectors are in priority order. An entry may itself be a list of
+equivalent selectors, ones that match the same element in different markup
+variants (a data-hook attribute and the class beside it); only those are
+reordered by what matched last, so which element is extracted never depends on
+the pages parsed before.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from urllib.parse import urlsplit
+
+import soupsieve
+
+from services.metrics import SELECTOR_EVALUATIONS
+
+logger = logging.getLogger(__name__)
+
+MARKETPLACES_FILE = os.environ.get(
+    "MARKETPLACES_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "configs", "marketplaces.json")
+)
+
+REQUIRED_SELECTORS = {
+    "product_name", "product_image", "product_price",
+    "review", "review_title", "review_body", "review_rating", "next_page"
+}
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+class SelectorChain:
+    """Fallback selectors for one field, tried in priority order.
+
+    Within a group of equivalent selectors the one that last matched is tried first:
+    a marketplace serves the same layout to most requests, so later pages usually
+    need one evaluation per group instead of walking it.
+    """
+
+    def __init__(self, marketplace, field, selectors):
+        groups = [[entry] if isinstance(entry, str) else list(entry) for entry in selectors]
+        if not groups or not all(groups):
+            raise ValueError(f"{marketplace}: no selectors for {field}")
+        self.marketplace = marketplace
+        self.field = field
+        self.selectors = [selector for group in groups for selector in group]
+        self._groups = [[soupsieve.compile(selector) for selector in group] for group in groups]
+        self._names = groups
+        # Index of the member that last matched, per group
+        self._preferred = [0] * len(groups)
+        self._matched = (0, 0)
+
+    def _order(self):
+        for group, patterns in enumerate(self._groups):
+            preferred = self._preferred[group]
+            yield group, preferred
+            for i in range(len(patterns)):
+                if i != preferred:
+                    yield group, i
+
+    def first(self, tag, extract=None):
+        """The first element matched in tag, or the first truthy extract(element); None if nothing matches"""
+        evaluations = 0
+        result = None
+        for group, i in self._order():
+            evaluations += 1
+            element = self._groups[group][i].select_one(tag)
+            if element is None:
+                continue
+            value = extract(element) if extract else element
+            if extract is None or value:
+                self._preferred[group] = i
+                self._matched = (group, i)
+                result = value
+                break
+        SELECTOR_EVALUATIONS.inc(evaluations, marketplace=self.marketplace, field=self.field)
+        return result
+
+    def all(self, tag):
+        """Every element matched by the first selector that matches anything in tag"""
+        evaluations = 0
+        result = []
+        for group, i in self._order():
+            evaluations += 1
+            elements = self._groups[group][i].select(tag)
+            if elements:
+                self._preferred[group] = i
+                self._matched = (group, i)
+                result = elements
+                break
+        SELECTOR_EVALUATIONS.inc(evaluations, marketplace=self.marketplace, field=self.field)
+        return result
+
+    @property
+    def preferred(self):
+        """The selector that last matched"""
+        group, i = self._matched
+        return self._names[group][i]
+
+
+class MarketplaceProfile:
+    """URL rules, compiled selectors and block detection for one marketplace"""
+
+    def __init__(self, config):
+        self.name = config["name"]
+        self.label = config.get("label", self.name)
+        self.domains = [domain.lower() for domain in config.get("domains", [])]
+
+        missing = REQUIRED_SELECTORS - set(config["selectors"])
+        if missing:
+            raise ValueError(f"{self.name}: missing selectors {sorted(missing)}")
+        self.selectors = {
+            field: SelectorChain(self.name, field, selectors)
+            for field, selectors in config["selectors"].items()
+        }
+
+        self._product_id = re.compile(config["product_id_pattern"], re.IGNORECASE)
+        self._product_url = config["product_url"]
+        self._reviews_url = config["reviews_url"]
+        self.image_attributes = config.get("image_attributes", ["src"])
+        self.next_page_attribute = config.get("next_page_attribute", "href")
+        title_prefix = config.get("title_prefix_pattern")
+        self._title_prefix = re.compile(title_prefix) if title_prefix else None
+        self._rating = re.compile(config.get("rating_pattern", r"(\d+(?:\.\d+)?)"))
+        self.default_rating = float(config.get("default_rating", 3.0))
+
+        blocked = config.get("blocked", {})
+        self.blocked_status_codes = set(blocked.get("status_codes", []))
+        self.blocked_markers = list(blocked.get("markers", []))
+
+    def product_id(self, url):
+        """The marketplace's product identifier embedded in url (an ASIN on Amazon), if any"""
+        match = self._product_id.search(urlsplit(url).path)
+        return match.group(1).upper() if match else None
+
+    def serves(self, host):
+        """Whether host is one of this marketplace's domains or a subdomain of one"""
+        host = host.lower()
+        return any(host == domain or host.endswith("." + domain) for domain in self.domains)
+
+    def origin(self, url):
+        """scheme://host of url in one form for every way of writing it.
+
+        A leading www. is dropped, and the marketplace's own hosts always use https;
+        other hosts (such as the local mock storefront) keep their scheme.
+        """
+        parts = urlsplit(url)
+        host = parts.netloc.lower().removeprefix("www.")
+        scheme = "https" if self.serves(parts.hostname or "") else parts.scheme.lower()
+        return f"{scheme}://{host}"
+
+    def _format(self, template, url):
+        product_id = self.product_id(url)
+        if not product_id:
+            return None
+        return template.format(origin=self.origin(url), product_id=product_id)
+
+    def product_url(self, url):
+        """Canonical product page URL for any product or reviews URL, or None if it has no product id"""
+        return self._format(self._product_url, url)
+
+    def reviews_url(self, url):
+        """First all-reviews page for a product URL, or None if it has no product id"""
+        return self._format(self._reviews_url, url)
+
+    def is_blocked(self, res):
+        """Bot detection: a blocking status code, or a 200 page carrying a captcha marker"""
+        return res.status_code in self.blocked_status_codes or any(marker in res.text for marker in self.blocked_markers)
+
+    def clean_title(self, title):
+        if self._title_prefix:
+            title = self._title_prefix.sub("", title)
+        return title.strip()
+
+    def parse_rating(self, text):
+        match = self._rating.search(text)
+        return float(match.group(1)) if match else self.default_rating
+
+    def info(self):
+        return {
+            "label": self.label,
+            "domains": self.domains,
+            "preferred_selectors": {field: chain.preferred for field, chain in self.selectors.items()}
+        }
+
+
+class MarketplaceRegistry:
+    def __init__(self, profiles, default):
+        self.profiles = {profile.name: profile for profile in profiles}
+        if default not in self.profiles:
+            raise ValueError(f"Default marketplace {default!r} has no profile")
+        self.default = self.profiles[default]
+        self._by_domain = {}
+        for profile in profiles:
+            for domain in profile.domains:
+                self._by_domain[domain] = profile
+
+    def profile_for(self, url):
+        """The profile whose domain is url's host or one of its parent domains, else the default"""
+        host = (urlsplit(url).hostname or "").lower()
+        labels = host.split(".")
+        # www.amazon.co.uk -> amazon.co.uk -> co.uk -> uk
+        for i in range(len(labels)):
+            profile = self._by_domain.get(".".join(labels[i:]))
+            if profile is not None:
+                return profile
+        logger.debug("No marketplace profile for %s, using %s", host, self.default.name)
+        return self.default
+
+
+def load_registry(path=MARKETPLACES_FILE):
+    """Build a registry from a profiles file, compiling every selector"""
+    with open(path) as f:
+        config = json.load(f)
+    profiles = [MarketplaceProfile(entry) for entry in config["profiles"]]
+    logger.info("Loaded %d marketplace profiles from %s", len(profiles), path)
+    return MarketplaceRegistry(profiles, config["default"])
+
+
+def get_registry():
+    """The process-wide registry, loaded on first use"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = load_registry()
+    return _registry
+
+
+def profile_for(url):
+    return get_registry().profile_for(url)
@@ -0,0 +1,142 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a single SQLite batch up to a slow Amazon page
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = []
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of a block; also usable as a decorator"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render_metrics():
+    """Render every registered metric as Prometheus text exposition"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Pipeline stages
+
+HTTP_FETCH_SECONDS = Histogram(
+    "scraper_http_fetch_seconds", "Time spent fetching a marketplace page", ("kind", "status"))
+PARSE_SECONDS = Histogram(
+    "scraper_parse_seconds", "Time spent parsing one review page")
+REVIEWS_PARSED = Counter(
+    "scraper_reviews_parsed_total", "Reviews extracted from review pages")
+SELECTOR_EVALUATIONS = Counter(
+    "scraper_selector_evaluations_total", "CSS selectors evaluated while extracting fields", ("marketplace", "field"))
+PRODUCTS_ENRICHED = Counter(
+    "products_enriched_total", "Product detail refreshes by outcome (updated, unchanged, failed)", ("outcome",))
+SENTIMENT_BATCH_SECONDS = Histogram(
+    "sentiment_batch_seconds", "Time spent scoring one batch of reviews")
+SENTIMENT_REVIEWS = Counter(
+    "sentiment_reviews_total", "Reviews scored for sentiment", ("outcome",))
+DB_INSERT_BATCH_SECONDS = Histogram(
+    "db_insert_batch_seconds", "Time spent inserting and committing one batch of reviews")
+DB_ROWS_INSERTED = Counter(
+    "db_rows_inserted_total", "Rows inserted", ("table",))
+REVIEWS_ARCHIVED = Counter(
+    "reviews_archived_total", "Reviews moved from the live database into archive files")
+PLOT_RENDER_SECONDS = Histogram(
+    "plot_render_seconds", "Time spent rendering a matplotlib plot", ("plot",))
+PAGE_RESPONSES = Counter(
+    "page_responses_total", "Cached HTML page responses by content coding (not_modified for a 304)", ("page", "encoding"))
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to produce a response, per route", ("method", "route", "status"))
+EXECUTOR_QUEUE_SECONDS = Histogram(
+    "executor_queue_seconds", "Time a blocking call waited for a free executor thread", ("executor",))
+EXECUTOR_REJECTED = Counter(
+    "executor_rejected_total", "Calls refused because an executor's queue was full", ("executor",))
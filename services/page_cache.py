@@ -0,0 +1,109 @@
+import gzip
+import hashlib
+import os
+import zlib
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+from services.metrics import PAGE_RESPONSES
+
+# Compression runs once per page per data version, so a better ratio than per-request middleware can afford
+PAGE_GZIP_LEVEL = int(os.environ.get("PAGE_GZIP_LEVEL", "6"))
+PAGE_BROTLI_QUALITY = int(os.environ.get("PAGE_BROTLI_QUALITY", "5"))
+# Pages larger than this keep only their compressed bodies; the rare client without gzip gets it decompressed
+PAGE_IDENTITY_MAX_BYTES = int(os.environ.get("PAGE_IDENTITY_MAX_BYTES", str(1024 * 1024)))
+# Compressed bytes decompressed per chunk when streaming such a page
+PAGE_STREAM_CHUNK_BYTES = int(os.environ.get("PAGE_STREAM_CHUNK_BYTES", str(64 * 1024)))
+
+
+def _brotli_compress(body):
+    # Optional dependency: without the brotli package pages are offered as gzip only
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(body, quality=PAGE_BROTLI_QUALITY)
+
+
+def _accepted_encodings(header):
+    """Content codings the client accepts with a non-zero q value"""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def _gunzip_chunks(body):
+    """Decompress a gzip body piece by piece, so no step holds the whole page or a thread for long"""
+    decompressor = zlib.decompressobj(wbits=31)
+    for start in range(0, len(body), PAGE_STREAM_CHUNK_BYTES):
+        chunk = decompressor.decompress(body[start:start + PAGE_STREAM_CHUNK_BYTES])
+        if chunk:
+            yield chunk
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: our tag is weak because the same page is sent under several encodings
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+class RenderedPage:
+    """One rendered HTML page, hashed and compressed once and then served to every request.
+
+    Build these inside a memoize_on_data_version() function so each page is
+    rendered and compressed once per data version; serving a repeat view is then a
+    cache lookup plus, for a client that already has it, a 304 without a body.
+    """
+
+    def __init__(self, name, html):
+        body = html.encode("utf-8")
+        self.name = name
+        self.size = len(body)
+        self.etag = f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self.bodies = {"gzip": gzip.compress(body, PAGE_GZIP_LEVEL, mtime=0)}
+        compressed = _brotli_compress(body)
+        if compressed is not None:
+            self.bodies["br"] = compressed
+        if self.size <= PAGE_IDENTITY_MAX_BYTES:
+            self.bodies["identity"] = body
+
+    def _body(self, accepted):
+        """(encoding, body) for the client; body is None for a large page the client cannot take compressed"""
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.bodies:
+                return encoding, self.bodies[encoding]
+        return "identity", self.bodies.get("identity")
+
+    def response(self, request):
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if _etag_matches(request.headers.get("if-none-match"), self.etag):
+            PAGE_RESPONSES.inc(page=self.name, encoding="not_modified")
+            return Response(status_code=304, headers=headers)
+
+        encoding, body = self._body(_accepted_encodings(request.headers.get("accept-encoding")))
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        PAGE_RESPONSES.inc(page=self.name, encoding=encoding)
+        if body is None:
+            # Starlette iterates a sync generator on its threadpool, keeping decompression off the event loop
+            return StreamingResponse(_gunzip_chunks(self.bodies["gzip"]), media_type="text/html", headers=headers)
+        return Response(content=body, media_type="text/html", headers=headers)
@@ -1,8 +1,28 @@
-
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import io
+import logging
+
+from services.metrics import PLOT_RENDER_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_plt = None
+
+
+def _pyplot():
+    """matplotlib.pyplot on the Agg backend, imported on first use to keep app startup fast"""
+    global _plt
+    if _plt is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        _plt = plt
+    return _plt
+
+
+def warm_up():
+    """Import matplotlib and scipy.stats ahead of the first plot request"""
+    _pyplot()
+    from scipy import stats  # used by generate_rating_spread_plot
 
 def _set_dark_theme(fig, ax):
     """Applies a consistent dark theme to the plot."""
@@ -30,21 +50,23 @@ def _handle_empty_data(ax, message="No Data Available"):
     ax.set_yticks([])
 
 def generate_review_length_plot(reviews):
+    return render_review_lengths([len(r["review_text"]) for r in reviews if r.get("review_text")])
+
+@PLOT_RENDER_SECONDS.time(plot="review_length")
+def render_review_lengths(lengths):
+    """Histogram of non-empty review lengths (a list or numpy array)"""
+    plt = _pyplot()
     fig, ax = plt.subplots(figsize=(10, 6))
     _set_dark_theme(fig, ax)
     
-    if not reviews:
+    if not len(lengths):
         _handle_empty_data(ax)
     else:
-        lengths = [len(r["review_text"]) for r in reviews if r.get("review_text")]
-        if not lengths:
-            _handle_empty_data(ax)
-        else:
-            ax.hist(lengths, bins=20, color='#8ab4f8', edgecolor='#202124')
-            ax.set_title('Distribution of Review Lengths', pad=20)
-            ax.set_xlabel('Review Length (characters)')
-            ax.set_ylabel('Number of Reviews')
-            ax.grid(axis='y', alpha=0.1, color='#e8eaed')
+        ax.hist(lengths, bins=20, color='#8ab4f8', edgecolor='#202124')
+        ax.set_title('Distribution of Review Lengths', pad=20)
+        ax.set_xlabel('Review Length (characters)')
+        ax.set_ylabel('Number of Reviews')
+        ax.grid(axis='y', alpha=0.1, color='#e8eaed')
 
     img = io.BytesIO()
     fig.savefig(img, format='png', bbox_inches='tight', facecolor=fig.get_facecolor())
@@ -53,22 +75,24 @@ def generate_review_length_plot(reviews):
     return img
 
 def generate_sentiment_polarity_plot(reviews):
+    return render_polarities([r["polarity"] for r in reviews if r.get("polarity") is not None])
+
+@PLOT_RENDER_SECONDS.time(plot="sentiment_polarity")
+def render_polarities(polarities):
+    """Histogram of known polarity scores (a list or numpy array)"""
+    plt = _pyplot()
     fig, ax = plt.subplots(figsize=(10, 6))
     _set_dark_theme(fig, ax)
     
-    if not reviews:
+    if not len(polarities):
         _handle_empty_data(ax)
     else:
-        polarities = [r["polarity"] for r in reviews if r.get("polarity") is not None]
-        if not polarities:
-            _handle_empty_data(ax)
-        else:
-            ax.hist(polarities, bins=20, range=(-1, 1), color='#34a853', edgecolor='#202124')
-            ax.set_title('Distribution of Sentiment Polarity', pad=20)
-            ax.set_xlabel('Polarity Score (-1 to 1)')
-            ax.set_ylabel('Number of Reviews')
-            ax.axvline(0, color='#f28b82', linestyle='dashed', linewidth=1.5)
-            ax.grid(axis='y', alpha=0.1, color='#e8eaed')
+        ax.hist(polarities, bins=20, range=(-1, 1), color='#34a853', edgecolor='#202124')
+        ax.set_title('Distribution of Sentiment Polarity', pad=20)
+        ax.set_xlabel('Polarity Score (-1 to 1)')
+        ax.set_ylabel('Number of Reviews')
+        ax.axvline(0, color='#f28b82', linestyle='dashed', linewidth=1.5)
+        ax.grid(axis='y', alpha=0.1, color='#e8eaed')
 
     img = io.BytesIO()
     fig.savefig(img, format='png', bbox_inches='tight', facecolor=fig.get_facecolor())
@@ -77,23 +101,32 @@ def generate_sentiment_polarity_plot(reviews):
     return img
 
 def generate_length_by_rating_plot(reviews):
-    fig, ax = plt.subplots(figsize=(10, 6))
-    _set_dark_theme(fig, ax)
-    
     # Organize data by rating
     data = [[] for _ in range(5)] # 1 to 5 stars
-    has_data = False
     
     for r in reviews:
         try:
             rating = int(r["rating"])
             if 1 <= rating <= 5 and r.get("review_text"):
                 data[rating-1].append(len(r["review_text"]))
-                has_data = True
         except (ValueError, TypeError):
             continue
-            
-    if not has_data:
+
+    return render_lengths_by_rating(data)
+
+def lengths_by_star(ratings, lengths):
+    """Non-empty review lengths split into 1-5 star groups, from numpy columns"""
+    has_text = lengths > 0
+    return [lengths[has_text & (ratings == star)] for star in range(1, 6)]
+
+@PLOT_RENDER_SECONDS.time(plot="length_by_rating")
+def render_lengths_by_rating(data):
+    """Box plot of review lengths, given five sequences of lengths for 1-5 stars"""
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(10, 6))
+    _set_dark_theme(fig, ax)
+
+    if not any(len(lengths) for lengths in data):
         _handle_empty_data(ax)
     else:
         # Filter out empty categories for boxplot but keep labels
@@ -118,73 +151,76 @@ def generate_length_by_rating_plot(reviews):
 
 def generate_rating_spread_plot(reviews):
     """Generate rating spread & variance visualization"""
+    logger.debug("[Rating Spread Plot] Received %d reviews", len(reviews))
+    return render_rating_spread([r["rating"] for r in reviews if r.get("rating") is not None])
+
+@PLOT_RENDER_SECONDS.time(plot="rating_spread")
+def render_rating_spread(ratings):
+    """Rating histogram with KDE, mean and std dev lines, from known ratings (a list or numpy array)"""
     import numpy as np
     from scipy import stats as scipy_stats
-    
+
+    ratings = np.asarray(ratings, dtype=np.float64)
+    plt = _pyplot()
     fig, ax = plt.subplots(figsize=(10, 6))
     _set_dark_theme(fig, ax)
     
-    print(f"[Rating Spread Plot] Received {len(reviews)} reviews")
-    
-    if not reviews:
-        print("[Rating Spread Plot] No reviews, showing empty data message")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[Rating Spread Plot] Extracted %d ratings: %s", len(ratings), ratings[:10].tolist())
+
+    if not len(ratings):
+        logger.debug("[Rating Spread Plot] No valid ratings, showing empty data message")
         _handle_empty_data(ax)
     else:
-        ratings = [r["rating"] for r in reviews if r.get("rating") is not None]
-        print(f"[Rating Spread Plot] Extracted {len(ratings)} ratings: {ratings[:10]}")
+        # Create histogram
+        counts, bins, patches = ax.hist(ratings, bins=[0.5, 1.5, 2.5, 3.5, 4.5, 5.5], 
+                                       color='#5f9ea0', edgecolor='#202124', alpha=0.8)
+        
+        # Calculate statistics
+        mean_rating = np.mean(ratings)
+        std_rating = np.std(ratings, ddof=1) if len(ratings) > 1 else 0
+        
+        logger.debug("[Rating Spread Plot] Mean: %.2f, Std: %.2f", mean_rating, std_rating)
+        
+        # Only add KDE curve if there's variance in the data
+        if np.ptp(ratings) > 0:
+            try:
+                # Create smooth curve overlay
+                x_smooth = np.linspace(ratings.min() - 0.5, ratings.max() + 0.5, 100)
+                kde = scipy_stats.gaussian_kde(ratings)
+                y_smooth = kde(x_smooth) * len(ratings) * 1.0  # Scale to match histogram
+                ax.plot(x_smooth, y_smooth, color='#2f4f4f', linewidth=2.5, label='Distribution Curve')
+            except Exception as e:
+                logger.debug("[Rating Spread Plot] KDE error: %s", e)
+        
+        # Add mean line
+        ax.axvline(mean_rating, color='#dc143c', linestyle='--', linewidth=2.5, 
+                  label=f'Mean: {mean_rating:.2f}', alpha=0.9)
+        
+        # Add std dev boundaries only if there's variance
+        if std_rating > 0:
+            ax.axvline(mean_rating - std_rating, color='#ffa500', linestyle=':', linewidth=2, 
+                      label='Std Dev Range', alpha=0.7)
+            ax.axvline(mean_rating + std_rating, color='#ffa500', linestyle=':', linewidth=2, alpha=0.7)
+        
+        ax.set_title('Rating Spread & Variance', pad=20, fontsize=14, fontweight='bold')
+        ax.set_xlabel('rating_numeric', fontsize=11)
+        ax.set_ylabel('Count', fontsize=11)
+        ax.set_xticks([1, 2, 3, 4, 5])
+        ax.legend(loc='upper left', framealpha=0.9, facecolor='#303134', edgecolor='#5f6368')
+        ax.grid(axis='y', alpha=0.1, color='#e8eaed', linestyle='--')
+        
+        # Set background
+        ax.set_facecolor('#d3d3d3')
+        fig.patch.set_facecolor('#d3d3d3')
         
-        if not ratings:
-            print("[Rating Spread Plot] No valid ratings, showing empty data message")
-            _handle_empty_data(ax)
-        else:
-            # Create histogram
-            counts, bins, patches = ax.hist(ratings, bins=[0.5, 1.5, 2.5, 3.5, 4.5, 5.5], 
-                                           color='#5f9ea0', edgecolor='#202124', alpha=0.8)
-            
-            # Calculate statistics
-            mean_rating = np.mean(ratings)
-            std_rating = np.std(ratings, ddof=1) if len(ratings) > 1 else 0
-            
-            print(f"[Rating Spread Plot] Mean: {mean_rating:.2f}, Std: {std_rating:.2f}")
-            
-            # Only add KDE curve if there's variance in the data
-            if len(set(ratings)) > 1:
-                try:
-                    # Create smooth curve overlay
-                    x_smooth = np.linspace(min(ratings) - 0.5, max(ratings) + 0.5, 100)
-                    kde = scipy_stats.gaussian_kde(ratings)
-                    y_smooth = kde(x_smooth) * len(ratings) * 1.0  # Scale to match histogram
-                    ax.plot(x_smooth, y_smooth, color='#2f4f4f', linewidth=2.5, label='Distribution Curve')
-                except Exception as e:
-                    print(f"[Rating Spread Plot] KDE error: {e}")
-            
-            # Add mean line
-            ax.axvline(mean_rating, color='#dc143c', linestyle='--', linewidth=2.5, 
-                      label=f'Mean: {mean_rating:.2f}', alpha=0.9)
-            
-            # Add std dev boundaries only if there's variance
-            if std_rating > 0:
-                ax.axvline(mean_rating - std_rating, color='#ffa500', linestyle=':', linewidth=2, 
-                          label='Std Dev Range', alpha=0.7)
-                ax.axvline(mean_rating + std_rating, color='#ffa500', linestyle=':', linewidth=2, alpha=0.7)
-            
-            ax.set_title('Rating Spread & Variance', pad=20, fontsize=14, fontweight='bold')
-            ax.set_xlabel('rating_numeric', fontsize=11)
-            ax.set_ylabel('Count', fontsize=11)
-            ax.set_xticks([1, 2, 3, 4, 5])
-            ax.legend(loc='upper left', framealpha=0.9, facecolor='#303134', edgecolor='#5f6368')
-            ax.grid(axis='y', alpha=0.1, color='#e8eaed', linestyle='--')
-            
-            # Set background
-            ax.set_facecolor('#d3d3d3')
-            fig.patch.set_facecolor('#d3d3d3')
-            
-            print("[Rating Spread Plot] Plot generated successfully")
+        logger.debug("[Rating Spread Plot] Plot generated successfully")
 
     img = io.BytesIO()
     fig.savefig(img, format='png', bbox_inches='tight', dpi=120, facecolor=fig.get_facecolor())
     plt.close(fig)
     img.seek(0)
-    print(f"[Rating Spread Plot] Image size: {len(img.getvalue())} bytes")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[Rating Spread Plot] Image size: %d bytes", len(img.getvalue()))
     return img
 
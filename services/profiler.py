@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+# Clients allowed to request a profile with the X-Profile header or ?profile=1
+PROFILE_ALLOWED_CLIENTS = {c.strip() for c in os.environ.get("PROFILE_ALLOWED_CLIENTS", "127.0.0.1,::1").split(",") if c.strip()}
+# Fraction of all requests profiled regardless of client, e.g. 0.01 for 1%
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+
+# Innermost frames that mean a thread is parked, not working
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+# Requests in flight and started so far in this process, so a profile can report its concurrency
+_requests_lock = threading.Lock()
+_requests_in_flight = 0
+_requests_started = 0
+
+
+def request_started():
+    global _requests_in_flight, _requests_started
+    with _requests_lock:
+        _requests_in_flight += 1
+        _requests_started += 1
+
+
+def request_finished():
+    global _requests_in_flight
+    with _requests_lock:
+        _requests_in_flight -= 1
+
+
+def is_allowed_client(request):
+    return request.client is not None and request.client.host in PROFILE_ALLOWED_CLIENTS
+
+
+def should_profile(request):
+    """Profile on explicit opt-in from an allowed client, or for a random sample of requests"""
+    requested = request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+    if requested and is_allowed_client(request):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class SamplingProfiler:
+    """Statistical profiler sampling the stacks of every busy thread in the process.
+
+    Routes share the event loop and the DB and render executors, so all threads are
+    sampled; parked threads are skipped. Requests running concurrently with the
+    profiled one show up in its profile too, and concurrent_requests counts them
+    (requests in flight when it started plus those started before it stopped) so a
+    mixed profile can be told from a clean one.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = None
+        self.duration = 0.0
+        self.concurrent_requests = 0
+
+    def start(self):
+        with _requests_lock:
+            # Not counting the profiled request itself
+            self._in_flight_at_start = _requests_in_flight - 1
+            self._started_at_start = _requests_started
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._start
+        with _requests_lock:
+            self.concurrent_requests = max(0, self._in_flight_at_start) + _requests_started - self._started_at_start
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.append((names.get(thread_id, str(thread_id)), "", 0))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed-stack format, one 'root;...;leaf count' line per stack"""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            frames = ";".join(name if not filename else f"{name} ({os.path.basename(filename)}:{line})"
+                              for name, filename, line in stack)
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name):
+        """Profile in the speedscope file format (https://www.speedscope.app)"""
+        frame_index = {}
+        frames = []
+        samples = []
+        weights = []
+        for stack, count in self.stacks.items():
+            indexes = []
+            for key in stack:
+                if key not in frame_index:
+                    frame_name, filename, line = key
+                    frame_index[key] = len(frames)
+                    frames.append({"name": frame_name, "file": filename, "line": line} if filename else {"name": frame_name})
+                indexes.append(frame_index[key])
+            samples.append(indexes)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "services.profiler",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights
+            }]
+        }
+
+
+def save_profile(profiler, request, status, scrapes_in_flight=0):
+    """Write .speedscope.json and .collapsed files for a finished profile and return its id.
+
+    scrapes_in_flight: scrape streams running when it stopped; their requests stop
+    counting as in flight once headers are sent, but they keep running on the loop.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    route = request.url.path.strip("/").replace("/", "_") or "index"
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profiler.started_at))
+    millis = int(profiler.started_at * 1000) % 1000
+    profile_id = f"{stamp}-{millis:03d}-{request.method}-{route}"
+    title = f"{request.method} {request.url.path} ({status}, {profiler.duration * 1000:.1f} ms)"
+
+    with open(os.path.join(PROFILE_DIR, profile_id + ".speedscope.json"), "w") as f:
+        json.dump(profiler.speedscope(title), f)
+    with open(os.path.join(PROFILE_DIR, profile_id + ".collapsed"), "w") as f:
+        f.write(profiler.collapsed())
+    with open(os.path.join(PROFILE_DIR, profile_id + ".meta.json"), "w") as f:
+        json.dump({
+            "id": profile_id,
+            "method": request.method,
+            "path": request.url.path,
+            "status": status,
+            "started_at": profiler.started_at,
+            "duration_ms": round(profiler.duration * 1000, 2),
+            "samples": profiler.sample_count,
+            "concurrent_requests": profiler.concurrent_requests,
+            "scrapes_in_flight": scrapes_in_flight
+        }, f)
+
+    _prune()
+    logger.info("Saved profile %s: %s", profile_id, title)
+    return profile_id
+
+
+def _prune():
+    metas = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".meta.json"))
+    for meta in metas[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        profile_id = meta[:-len(".meta.json")]
+        for suffix in (".meta.json", ".speedscope.json", ".collapsed"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Metadata of saved profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if name.endswith(".meta.json"):
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                profiles.append(json.load(f))
+    return profiles
+
+
+def profile_path(profile_id, fmt):
+    """Path of a saved profile file, or None if it does not exist"""
+    suffix = {"speedscope": ".speedscope.json", "collapsed": ".collapsed"}.get(fmt)
+    if suffix is None or os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + suffix)
+    return path if os.path.isfile(path) else None
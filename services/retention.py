@@ -0,0 +1,388 @@
+"""Retention: move old reviews out of the live database into compressed archive files.
+
+Each archive file holds one batch of one product's reviews as compressed numpy
+columns (.npz, no pickled objects). The review_archives table lists every file so
+history stays queryable, and the daily rollups are never touched, so trends keep
+covering archived reviews. Freed pages are returned to the filesystem by
+incremental vacuum in small steps.
+"""
+import logging
+import os
+import threading
+import time
+
+from configs.database import DB_NAME, get_db
+from services.metrics import REVIEWS_ARCHIVED
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", os.path.join(os.path.dirname(DB_NAME) or ".", "archive"))
+# Defaults for products without their own policy; 0 means no limit
+RETENTION_MAX_AGE_DAYS = int(os.environ.get("RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_KEEP_LATEST = int(os.environ.get("RETENTION_KEEP_LATEST", "0"))
+# Seconds between background retention passes; 0 disables the background thread
+RETENTION_INTERVAL_SECONDS = int(os.environ.get("RETENTION_INTERVAL_SECONDS", "3600"))
+# Reviews per archive file, written and deleted in one transaction
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "5000"))
+# Pages released per incremental vacuum step, so writers wait at most one short step
+VACUUM_STEP_PAGES = int(os.environ.get("VACUUM_STEP_PAGES", "512"))
+
+_TEXT_COLUMNS = ("review_title", "review_text")
+
+_stop = threading.Event()
+
+
+def _effective_policy(policy):
+    """(max_age_days, keep_latest) for a policy row or None, falling back to the defaults"""
+    max_age_days = policy["max_age_days"] if policy is not None and policy["max_age_days"] is not None else RETENTION_MAX_AGE_DAYS
+    keep_latest = policy["keep_latest"] if policy is not None and policy["keep_latest"] is not None else RETENTION_KEEP_LATEST
+    return max_age_days, keep_latest
+
+
+def set_policy(product_id, max_age_days=None, keep_latest=None):
+    """Set a product's retention policy; None for a field means the default applies.
+
+    Returns False, writing nothing, if there is no such product.
+    """
+    conn = get_db()
+    try:
+        # One statement, so a product deleted meanwhile cannot be left with an orphan policy
+        stored = conn.execute("""
+            INSERT INTO retention_policies (product_id, max_age_days, keep_latest)
+            SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM products WHERE product_id = ?)
+            ON CONFLICT (product_id) DO UPDATE SET
+                max_age_days = excluded.max_age_days,
+                keep_latest = excluded.keep_latest,
+                updated_at = CURRENT_TIMESTAMP
+        """, (product_id, max_age_days, keep_latest, product_id)).rowcount > 0
+        conn.commit()
+        return stored
+    finally:
+        conn.close()
+
+
+def _encode_strings(values):
+    """A string column as one UTF-8 buffer plus end offsets, so no object arrays are needed"""
+    import numpy as np
+    encoded = [(value or "").encode("utf-8") for value in values]
+    offsets = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _decode_strings(data, offsets):
+    buffer = data.tobytes()
+    starts = [0] + offsets[:-1].tolist()
+    return [buffer[start:end].decode("utf-8") for start, end in zip(starts, offsets.tolist())]
+
+
+def _write_archive(product_id, rows):
+    """Write rows (reviews table rows, ordered by id) to a new archive file, returning its relative path"""
+    import numpy as np
+
+    sentiments = [row["sentiment"] or "" for row in rows]
+    labels, sentiment_codes = np.unique(np.array(sentiments, dtype=str), return_inverse=True)
+    columns = {
+        "id": np.array([row["id"] for row in rows], dtype=np.int64),
+        "rating": np.array([row["rating"] for row in rows], dtype=np.float64),  # None becomes NaN
+        "polarity": np.array([row["polarity"] for row in rows], dtype=np.float64),
+        "created_at": np.array([row["created_at"] or "NaT" for row in rows], dtype="datetime64[s]"),
+        "sentiment_labels": labels,
+        "sentiment": sentiment_codes.astype(np.uint8),
+        "product_id": np.array([product_id], dtype=str),
+    }
+    for name in _TEXT_COLUMNS:
+        columns[f"{name}_data"], columns[f"{name}_offsets"] = _encode_strings(row[name] for row in rows)
+
+    relative = os.path.join(product_id, f"{rows[0]['id']}-{rows[-1]['id']}.npz")
+    path = os.path.join(ARCHIVE_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write under a temporary name so a crash never leaves a truncated archive at the final path
+    with open(path + ".tmp", "wb") as f:
+        np.savez_compressed(f, **columns)
+    os.replace(path + ".tmp", path)
+    return relative
+
+
+def _read_archive(relative):
+    import numpy as np
+    with np.load(os.path.join(ARCHIVE_DIR, relative), allow_pickle=False) as archive:
+        columns = {name: archive[name] for name in archive.files}
+    for name in _TEXT_COLUMNS:
+        columns[name] = _decode_strings(columns.pop(f"{name}_data"), columns.pop(f"{name}_offsets"))
+    return columns
+
+
+def _remove_files(paths):
+    directories = set()
+    for relative in paths:
+        path = os.path.join(ARCHIVE_DIR, relative)
+        directories.add(os.path.dirname(path))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    for directory in directories:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            # Still holds other archives
+            pass
+
+
+def _archive_batch(conn, product_id, max_age_days, keep_latest):
+    """Archive and delete up to ARCHIVE_BATCH_SIZE of a product's expired reviews; returns the count"""
+    conditions = []
+    params = {"product_id": product_id, "batch": ARCHIVE_BATCH_SIZE}
+    if max_age_days:
+        conditions.append("created_at < datetime('now', :age)")
+        params["age"] = f"-{max_age_days} days"
+    if keep_latest:
+        # Everything at or below the newest review that falls outside keep_latest
+        cutoff = conn.execute("""
+            SELECT id FROM reviews WHERE product_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+        """, (product_id, keep_latest)).fetchone()
+        if cutoff is not None:
+            conditions.append("id <= :cutoff_id")
+            params["cutoff_id"] = cutoff["id"]
+    if not conditions:
+        return 0
+
+    rows = conn.execute(f"""
+        SELECT id, review_title, review_text, rating, sentiment, polarity, created_at
+        FROM reviews
+        WHERE product_id = :product_id AND ({' OR '.join(conditions)})
+        ORDER BY id
+        LIMIT :batch
+    """, params).fetchall()
+    if not rows:
+        return 0
+
+    relative = _write_archive(product_id, rows)
+    created = [row["created_at"] for row in rows if row["created_at"]]
+    try:
+        conn.execute("""
+            INSERT INTO review_archives (product_id, path, first_review_id, last_review_id, review_count, oldest, newest, bytes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            product_id, relative, rows[0]["id"], rows[-1]["id"], len(rows),
+            min(created, default=None), max(created, default=None),
+            os.path.getsize(os.path.join(ARCHIVE_DIR, relative))
+        ))
+        conn.executemany("DELETE FROM reviews WHERE id = ?", [(row["id"],) for row in rows])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        _remove_files([relative])
+        raise
+    REVIEWS_ARCHIVED.inc(len(rows))
+    return len(rows)
+
+
+def apply_retention():
+    """Archive every product's reviews that fall outside its policy; returns {product_id: archived}"""
+    conn = get_db()
+    try:
+        policies = {row["product_id"]: row for row in conn.execute("SELECT * FROM retention_policies")}
+        product_ids = [row["product_id"] for row in conn.execute("SELECT product_id FROM products")]
+        archived = {}
+        for product_id in product_ids:
+            max_age_days, keep_latest = _effective_policy(policies.get(product_id))
+            if not max_age_days and not keep_latest:
+                continue
+            total = 0
+            while not _stop.is_set():
+                # IMMEDIATE: the batch is read, written out and deleted under one write lock,
+                # so two workers running retention can never archive the same reviews
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    count = _archive_batch(conn, product_id, max_age_days, keep_latest)
+                finally:
+                    if conn.in_transaction:
+                        conn.rollback()
+                total += count
+                if count < ARCHIVE_BATCH_SIZE:
+                    break
+            if total:
+                archived[product_id] = total
+                logger.info("Archived %d reviews of product %s", total, product_id)
+        return archived
+    finally:
+        conn.close()
+
+
+def incremental_vacuum(max_steps=None):
+    """Release free pages to the filesystem in VACUUM_STEP_PAGES steps; returns pages released.
+
+    Only effective once the database is in auto_vacuum=INCREMENTAL mode, which new
+    databases are (see init_db); an older database needs one full_vacuum() first.
+    """
+    conn = get_db()
+    released = 0
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        steps = 0
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free and not _stop.is_set() and (max_steps is None or steps < max_steps):
+            # executescript steps the pragma to completion; execute() would free a single page
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES});")
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            released += free - remaining
+            free = remaining
+            steps += 1
+            # Let waiting writers in between steps
+            time.sleep(0.01)
+        if released:
+            # The file only shrinks once the WAL is checkpointed; PASSIVE never blocks
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    finally:
+        conn.close()
+    return released
+
+
+def full_vacuum():
+    """Rebuild the database file in auto_vacuum=INCREMENTAL mode (blocks writers while it runs)"""
+    conn = get_db()
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def delete_product(product_id):
+    """Delete a product with its reviews, rollups, checkpoint, policy, price history and archive files.
+
+    Returns the number of live reviews deleted, or None if there is no such product.
+    """
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("SELECT 1 FROM products WHERE product_id = ?", (product_id,)).fetchone() is None:
+            conn.rollback()
+            return None
+        paths = [row["path"] for row in conn.execute("SELECT path FROM review_archives WHERE product_id = ?", (product_id,))]
+        deleted = conn.execute("DELETE FROM reviews WHERE product_id = ?", (product_id,)).rowcount
+        for table in ("review_daily_rollups", "scrape_checkpoints", "retention_policies", "review_archives",
+                      "product_details_state", "product_price_history", "products"):
+            conn.execute(f"DELETE FROM {table} WHERE product_id = ?", (product_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    # Files go only after the commit: a failed delete must not lose archived history
+    _remove_files(paths)
+    logger.info("Deleted product %s (%d live reviews, %d archive files)", product_id, deleted, len(paths))
+    return deleted
+
+
+def clear_archives():
+    """Remove every archive file and its manifest row (used when clearing all data)"""
+    conn = get_db()
+    try:
+        paths = [row["path"] for row in conn.execute("SELECT path FROM review_archives")]
+        conn.execute("DELETE FROM review_archives")
+        conn.commit()
+    finally:
+        conn.close()
+    _remove_files(paths)
+
+
+def query_archive(product_id, start=None, end=None, limit=100):
+    """A product's archived reviews created between start and end (dates, inclusive), most recently stored first"""
+    import numpy as np
+
+    conn = get_db()
+    try:
+        # Only files whose date range overlaps the requested one are opened
+        files = conn.execute("""
+            SELECT path FROM review_archives
+            WHERE product_id = ?
+              AND (? IS NULL OR date(newest) >= ?)
+              AND (? IS NULL OR date(oldest) <= ?)
+            ORDER BY last_review_id DESC
+        """, (product_id, start, start, end, end)).fetchall()
+    finally:
+        conn.close()
+
+    reviews = []
+    for file in files:
+        columns = _read_archive(file["path"])
+        days = columns["created_at"].astype("datetime64[D]")
+        mask = np.ones(len(columns["id"]), dtype=bool)
+        if start:
+            mask &= days >= np.datetime64(start)
+        if end:
+            mask &= days <= np.datetime64(end)
+        labels = columns["sentiment_labels"]
+        # Newest first within the file too
+        for i in np.flatnonzero(mask)[::-1]:
+            reviews.append({
+                "id": int(columns["id"][i]),
+                "review_title": columns["review_title"][i],
+                "review_text": columns["review_text"][i],
+                "rating": None if np.isnan(columns["rating"][i]) else float(columns["rating"][i]),
+                "sentiment": str(labels[columns["sentiment"][i]]) or None,
+                "polarity": None if np.isnan(columns["polarity"][i]) else float(columns["polarity"][i]),
+                "created_at": None if np.isnat(columns["created_at"][i]) else str(columns["created_at"][i]).replace("T", " "),
+            })
+            if limit is not None and len(reviews) >= limit:
+                return reviews
+    return reviews
+
+
+def retention_summary():
+    """Policies, archive totals per product and database page usage"""
+    conn = get_db()
+    try:
+        policies = [dict(row) for row in conn.execute("SELECT * FROM retention_policies ORDER BY product_id")]
+        archives = [dict(row) for row in conn.execute("""
+            SELECT product_id, COUNT(*) AS files, SUM(review_count) AS reviews, SUM(bytes) AS bytes,
+                   MIN(oldest) AS oldest, MAX(newest) AS newest
+            FROM review_archives
+            GROUP BY product_id
+        """)]
+        pragma = {name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                  for name in ("page_size", "page_count", "freelist_count", "auto_vacuum")}
+    finally:
+        conn.close()
+    return {
+        "defaults": {"max_age_days": RETENTION_MAX_AGE_DAYS, "keep_latest": RETENTION_KEEP_LATEST},
+        "policies": policies,
+        "archives": archives,
+        "database": {
+            "bytes": pragma["page_size"] * pragma["page_count"],
+            "free_bytes": pragma["page_size"] * pragma["freelist_count"],
+            "incremental_vacuum": pragma["auto_vacuum"] == 2
+        }
+    }
+
+
+def run_retention():
+    """One retention pass: archive expired reviews, then give the freed pages back"""
+    start = time.perf_counter()
+    archived = apply_retention()
+    released = incremental_vacuum()
+    logger.info("Retention pass archived %d reviews and released %d pages in %.1f s",
+                sum(archived.values()), released, time.perf_counter() - start)
+    return {"archived": archived, "pages_released": released}
+
+
+def _run_periodically(interval):
+    while not _stop.wait(interval):
+        try:
+            run_retention()
+        except Exception:
+            logger.exception("Retention pass failed")
+
+
+def start_background(interval=RETENTION_INTERVAL_SECONDS):
+    """Run retention every interval seconds on a daemon thread; returns the thread or None if disabled"""
+    if interval <= 0:
+        return None
+    thread = threading.Thread(target=_run_periodically, args=(interval,), name="retention", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_background():
+    _stop.set()
@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+import time
+
+from configs.database import get_db, data_version
+
+logger = logging.getLogger(__name__)
+
+# Keep reviews resident as typed columns and serve the dashboard and plots from them
+REVIEW_STORE_ENABLED = os.environ.get("REVIEW_STORE", "0") == "1"
+
+_SELECT_COLUMNS = """
+    SELECT id, product_id, rating, polarity, length(review_text),
+           CASE lower(sentiment) WHEN 'positive' THEN 1 WHEN 'neutral' THEN 2 WHEN 'negative' THEN 3 ELSE 0 END
+    FROM reviews
+"""
+
+
+class ReviewColumns:
+    """A consistent, read-only snapshot of the store's columns.
+
+    rating is uint8 with 0 for a missing rating (star ratings are whole numbers),
+    polarity float32 with NaN for missing, length int32 with 0 for missing text,
+    sentiment uint8 using services.stats.SENTIMENT_CODES, and product a uint16 code
+    into product_ids.
+    """
+
+    def __init__(self, product, rating, polarity, length, sentiment, product_ids):
+        self.product = product
+        self.rating = rating
+        self.polarity = polarity
+        self.length = length
+        self.sentiment = sentiment
+        self.product_ids = product_ids
+
+    def __len__(self):
+        return len(self.rating)
+
+    def ratings_as_float(self):
+        """Ratings as float64 with NaN where missing, as calculate_metrics_from_columns expects"""
+        import numpy as np
+        ratings = self.rating.astype(np.float64)
+        ratings[self.rating == 0] = np.nan
+        return ratings
+
+    def polarities_as_float(self):
+        """Polarities as float64 rounded back to the 6 decimals float32 holds exactly,
+        so values like 0.1 land on the same side of thresholds as the stored REAL"""
+        import numpy as np
+        return np.round(self.polarity.astype(np.float64), 6)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in (self.product, self.rating, self.polarity, self.length, self.sentiment))
+
+
+class ReviewStore:
+    """Reviews held in memory as compact numpy columns, kept in step with SQLite.
+
+    refresh() is cheap when nothing was committed since the last call. Otherwise it
+    appends only rows with an id above the last one loaded, and reloads everything if
+    rows were deleted. Driven by data_version(), so writes from other workers are
+    picked up too.
+    """
+
+    def __init__(self, initial_capacity=1024):
+        self._lock = threading.Lock()
+        self._initial_capacity = initial_capacity
+        self._version = None
+        self._reset()
+
+    def _reset(self):
+        import numpy as np
+        capacity = self._initial_capacity
+        self._product = np.zeros(capacity, dtype=np.uint16)
+        self._rating = np.zeros(capacity, dtype=np.uint8)
+        self._polarity = np.zeros(capacity, dtype=np.float32)
+        self._length = np.zeros(capacity, dtype=np.int32)
+        self._sentiment = np.zeros(capacity, dtype=np.uint8)
+        self._size = 0
+        self._last_id = 0
+        self._product_ids = []
+        self._product_codes = {}
+
+    def _grow(self, needed):
+        import numpy as np
+        capacity = len(self._rating)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("_product", "_rating", "_polarity", "_length", "_sentiment"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _product_code(self, product_id):
+        import numpy as np
+        code = self._product_codes.get(product_id)
+        if code is None:
+            code = len(self._product_ids)
+            if code > np.iinfo(self._product.dtype).max:
+                self._product = self._product.astype(np.uint32)
+            self._product_codes[product_id] = code
+            self._product_ids.append(product_id)
+        return code
+
+    def _append(self, rows):
+        import numpy as np
+        if not rows:
+            return
+        start, end = self._size, self._size + len(rows)
+        self._grow(end)
+        ids, products, ratings, polarities, lengths, sentiments = zip(*rows)
+        self._product[start:end] = [self._product_code(pid) for pid in products]
+        self._rating[start:end] = np.rint(np.nan_to_num(np.array(ratings, dtype=np.float64), nan=0.0)).clip(0, 5)
+        self._polarity[start:end] = np.array(polarities, dtype=np.float64)  # None becomes NaN
+        self._length[start:end] = [length or 0 for length in lengths]
+        self._sentiment[start:end] = sentiments
+        self._size = end
+        self._last_id = max(self._last_id, max(ids))
+
+    def refresh(self):
+        """Bring the columns up to date with the database and return the current data version"""
+        version = data_version()
+        if version == self._version:
+            return version
+        with self._lock:
+            if version == self._version:
+                return version
+            start = time.perf_counter()
+            conn = get_db()
+            try:
+                # One read transaction so the new rows and the count agree
+                conn.execute("BEGIN")
+                new_rows = conn.execute(_SELECT_COLUMNS + " WHERE id > ? ORDER BY id", (self._last_id,)).fetchall()
+                total = conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+                if total != self._size + len(new_rows):
+                    # Rows were deleted (or rewritten below our high-water mark): start over
+                    self._reset()
+                    new_rows = conn.execute(_SELECT_COLUMNS + " ORDER BY id").fetchall()
+                    logger.info("Review store reloaded %d reviews in %.0f ms", len(new_rows), (time.perf_counter() - start) * 1000)
+                elif new_rows:
+                    logger.debug("Review store appended %d reviews", len(new_rows))
+                conn.rollback()
+            finally:
+                conn.close()
+            self._append([tuple(row) for row in new_rows])
+            self._version = version
+        return version
+
+    def snapshot(self):
+        """Up-to-date columns; later appends never change an existing snapshot"""
+        self.refresh()
+        with self._lock:
+            size = self._size
+            return ReviewColumns(
+                self._product[:size], self._rating[:size], self._polarity[:size],
+                self._length[:size], self._sentiment[:size], list(self._product_ids)
+            )
+
+    def info(self):
+        with self._lock:
+            return {
+                "reviews": self._size,
+                "products": len(self._product_ids),
+                "bytes_used": self._size * sum(
+                    column.itemsize for column in (self._product, self._rating, self._polarity, self._length, self._sentiment)
+                ),
+                "bytes_allocated": sum(
+                    column.nbytes for column in (self._product, self._rating, self._polarity, self._length, self._sentiment)
+                )
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide ReviewStore, or None when REVIEW_STORE is not enabled"""
+    global _store
+    if not REVIEW_STORE_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ReviewStore()
+    return _store
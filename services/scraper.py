@@ -1,100 +1,166 @@
 import requests
 from bs4 import BeautifulSoup
-import re
 import time
 import asyncio
+import os
 import random
-from urllib.parse import urljoin
+import logging
+from urllib.parse import urljoin, urlsplit
 
-def extract_product_details(url):
-    """Extract product details from Amazon product page"""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept-Encoding": "gzip, deflate, br",
-        "DNT": "1",
-        "Connection": "keep-alive",
-        "Upgrade-Insecure-Requests": "1"
-    }
-    
+from services.marketplaces import get_registry, profile_for
+from services.metrics import HTTP_FETCH_SECONDS, PARSE_SECONDS, REVIEWS_PARSED
+
+logger = logging.getLogger(__name__)
+
+# Multiplier for the politeness delays between requests; 0 disables them (local mock storefront only)
+SCRAPE_DELAY_SCALE = float(os.environ.get("SCRAPE_DELAY_SCALE", "1"))
+
+
+def canonicalize_product_url(url):
+    """Normalize the product page, reviews page and query-string variants of a product URL to one form"""
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+
+    profile = profile_for(url)
+    product_url = profile.product_url(url)
+    if product_url:
+        return product_url
+
+    # Not a recognizable product URL: normalize the origin and drop the query string and fragment
+    return f"{profile.origin(url)}{urlsplit(url).path.rstrip('/')}"
+
+
+def _fetch(url, headers, kind):
+    """GET a marketplace page, recording its latency by page kind and status"""
+    start = time.perf_counter()
+    status = "error"
     try:
-        # Get the main product page (not reviews page)
-        if "product-reviews" in url:
-            # Extract product ID and create main product URL
-            product_id = url.split("/product-reviews/")[1].split("/")[0]
-            url = f"https://www.amazon.in/dp/{product_id}"
-        
-        print(f"🛍️ Fetching product details from: {url}")
         res = requests.get(url, headers=headers, timeout=15)
-        res.raise_for_status()
-        
-        soup = BeautifulSoup(res.text, "html.parser")
-        
-        # Extract product name
-        name_selectors = [
-            "#productTitle",
-            "h1.a-size-large", 
-            ".product-title",
-            "h1 span"
-        ]
-        product_name = "Unknown Product"
-        for selector in name_selectors:
-            name_elem = soup.select_one(selector)
-            if name_elem:
-                product_name = name_elem.get_text(strip=True)
-                break
-        
-        # Extract product image
-        image_selectors = [
-            "#landingImage",
-            ".a-dynamic-image",
-            "img.a-image-wrapper img",
-            "#imgBlkFront"
-        ]
-        product_image = ""
-        for selector in image_selectors:
-            img_elem = soup.select_one(selector)
-            if img_elem:
-                product_image = img_elem.get("src") or img_elem.get("data-src") or ""
-                if product_image:
-                    break
-        
-        # Extract product price
-        price_selectors = [
-            ".a-price-whole",
-            ".a-offscreen",
-            ".a-price .a-offscreen",
-            "#corePrice_feature_div .a-price .a-offscreen",
-            ".a-size-medium.a-color-price"
-        ]
-        product_price = "Price not available"
-        for selector in price_selectors:
-            price_elem = soup.select_one(selector)
-            if price_elem:
-                product_price = price_elem.get_text(strip=True)
+        status = res.status_code
+        return res
+    finally:
+        HTTP_FETCH_SECONDS.observe(time.perf_counter() - start, kind=kind, status=status)
+
+PRODUCT_PAGE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate, br",
+    "DNT": "1",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1"
+}
+
+# Stored for fields a product page does not have
+DEFAULT_PRODUCT_DETAILS = {
+    "product_name": "Unknown Product",
+    "product_image": "",
+    "product_price": "Price not available"
+}
+
+
+class PageBlocked(Exception):
+    """The marketplace answered with a bot-detection page instead of the requested one"""
+
+
+def fetch_product_details(url):
+    """Fetch and parse a product page; fields the page does not have are None.
+
+    Raises on network and HTTP errors and on bot-detection pages, so callers can
+    tell a failed fetch from a product page without, say, a price.
+    """
+    profile = profile_for(url)
+    # Get the main product page (not reviews page)
+    url = profile.product_url(url) or url
+
+    logger.info("Fetching product details from %s", url)
+    res = _fetch(url, PRODUCT_PAGE_HEADERS, "product")
+    if profile.is_blocked(res):
+        raise PageBlocked(f"{profile.label} blocked the request for {url}")
+    res.raise_for_status()
+
+    soup = BeautifulSoup(res.text, "html.parser")
+    selectors = profile.selectors
+
+    name_elem = selectors["product_name"].first(soup)
+    # An image element may carry its URL in any of the profile's attributes
+    product_image = selectors["product_image"].first(
+        soup, lambda img: next((img.get(attr) for attr in profile.image_attributes if img.get(attr)), "")
+    )
+    price_elem = selectors["product_price"].first(soup)
+
+    return {
+        "product_name": name_elem.get_text(strip=True) if name_elem else None,
+        "product_url": url,
+        "product_image": product_image or None,
+        "product_price": price_elem.get_text(strip=True) if price_elem else None
+    }
+
+
+def parse_review_page(html, product_id=None, max_reviews=None, profile=None):
+    """Parse one page of reviews with a marketplace profile (the default profile if None).
+
+    Returns (reviews, next_href): at most max_reviews review dicts, and the href of
+    the next page's link (relative to the page URL) or None on the last page.
+    """
+    parse_start = time.perf_counter()
+    profile = profile or get_registry().default
+    selectors = profile.selectors
+    soup = BeautifulSoup(html, "html.parser")
+
+    page_blocks = selectors["review"].all(soup)
+
+    reviews = []
+    for block in page_blocks:
+        try:
+            if max_reviews is not None and len(reviews) >= max_reviews:
                 break
-        
-        product_details = {
-            "product_name": product_name,
-            "product_url": url,
-            "product_image": product_image,
-            "product_price": product_price
-        }
-        
-        print(f"✅ Product details extracted: {product_name}")
-        return product_details
-        
-    except Exception as e:
-        print(f"❌ Error extracting product details: {str(e)}")
-        return {
-            "product_name": "Unknown Product",
-            "product_url": url,
-            "product_image": "",
-            "product_price": "Price not available"
-        }
+
+            title_elem = selectors["review_title"].first(block)
+            review_title = profile.clean_title(title_elem.get_text(strip=True)) if title_elem else "Review"
+
+            text_elem = selectors["review_body"].first(block)
+            # Use separator to avoid jamming words together
+            review_text = text_elem.get_text(" ", strip=True) if text_elem else "No review text."
+
+            rating_elem = selectors["review_rating"].first(block)
+            rating_value = profile.parse_rating(rating_elem.get_text(strip=True)) if rating_elem else profile.default_rating
+
+            reviews.append({
+                "product_id": product_id,
+                "review_title": review_title,
+                "review_text": review_text,
+                "rating": rating_value
+            })
+        except Exception as e:
+            logger.debug("Error processing review: %s", e)
+            continue
+
+    # Pagination Logic
+    next_page = selectors["next_page"].first(soup)
+    next_href = next_page.get(profile.next_page_attribute) if next_page else None
+
+    PARSE_SECONDS.observe(time.perf_counter() - parse_start)
+    REVIEWS_PARSED.inc(len(reviews))
+    return reviews, next_href
 
 
-async def scrape_reviews(url: str, product_id=None, limit=100):
+def reviews_url(url):
+    """The first all-reviews page for a product URL"""
+    # Fall back to the URL itself when it has no recognizable product id
+    return profile_for(url).reviews_url(url) or url
+
+
+async def scrape_reviews(url: str, product_id=None, limit=100, start_url=None, start_count=0, start_page=1, start_offset=0):
+    """Scrape up to limit reviews, yielding each parsed page as {"type": "page", "reviews": [...]}.
+
+    Pages are yielded as soon as they are parsed and not kept afterwards, so memory
+    does not grow with limit. Fetching and parsing run in worker threads so the
+    event loop stays free while a page downloads. Each page event carries next_url
+    and next_offset, where a checkpoint resumes: the following page (None after the
+    last one) with offset 0, or, when limit cut the page short, this page's URL and
+    the number of its reviews taken. Resuming passes them back as start_url and
+    start_offset, with start_count reviews already collected.
+    """
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
@@ -111,144 +177,87 @@ async def scrape_reviews(url: str, product_id=None, limit=100):
 
     try:
         # Add delay to avoid being blocked
-        await asyncio.sleep(2)
+        await asyncio.sleep(2 * SCRAPE_DELAY_SCALE)
         
         # Ensure we are checking the main product page or reviews page
-        print(f"📡 Processing URL: {url}")
-        yield {"type": "progress", "count": 0, "total": limit, "message": f"Processing URL..."}
+        logger.debug("Processing URL: %s", url)
+        yield {"type": "progress", "stage": "fetch", "count": start_count, "total": limit, "message": f"Processing URL..."}
         
-        target_url = url
-        # If it's a direct product link, try to construct the reviews URL
-        if "/dp/" in url and "product-reviews" not in url:
-            try:
-                # Extract clean product ID
-                prod_id = url.split("/dp/")[1].split("/")[0].split("?")[0]
-                target_url = f"https://www.amazon.in/product-reviews/{prod_id}/ref=cm_cr_dp_d_show_all_btm?ie=UTF8&reviewerType=all_reviews"
-            except:
-                pass # Fallback to original URL if extraction fails
+        profile = profile_for(url)
+        target_url = start_url or profile.reviews_url(url) or url
+        count = start_count
+        page_num = start_page
+        # Reviews at the top of the first page that an earlier run already stored
+        skip = start_offset
         
-        print(f"📡 Fetching reviews from: {target_url}")
-        yield {"type": "progress", "count": 0, "total": limit, "message": "Fetching first page of reviews..."}
+        logger.info("Fetching reviews from %s", target_url)
+        message = "Fetching first page of reviews..." if page_num == 1 else f"Resuming at page {page_num}..."
+        yield {"type": "progress", "stage": "fetch", "page": page_num, "count": count, "total": limit, "message": message}
         
-        # Note: requests is blocking. For full async benefit, use aiohttp/httpx.
-        # But this wrapper is enough to solve the "async for" TypeError.
-        res = requests.get(target_url, headers=headers, timeout=15)
+        res = await asyncio.to_thread(_fetch, target_url, headers, "reviews")
         
-        # Check for bot detection/captcha (status 503 or 200 with captcha text)
-        if res.status_code == 503 or "Enter the characters you see below" in res.text:
-            print("⚠️ Amazon blocked the request (Captcha/Bot Detection).")
-            yield {"type": "error", "message": "Amazon blocked the request (Captcha/Bot Detection)."}
+        # Check for bot detection/captcha (a blocking status or a captcha page)
+        if profile.is_blocked(res):
+            logger.warning("%s blocked the request (Captcha/Bot Detection): %s", profile.label, target_url)
+            yield {"type": "error", "message": f"{profile.label} blocked the request (Captcha/Bot Detection)."}
             return
 
         res.raise_for_status()
         
-        soup = BeautifulSoup(res.text, "html.parser")
-        reviews = []
-        page_num = 1
-
-        # Updated selectors for 2024/2025 Amazon structure
-        review_selectors = [
-            "div[data-hook='review']",
-            "div.a-section.review",
-            "div[id^='customer_review']" 
-        ]
-        
-        while len(reviews) < limit:
-            print(f"Scraping page {page_num} for URL: {target_url}")
-            yield {"type": "progress", "count": len(reviews), "total": limit, "message": f"Scraping page {page_num}..."}
-            
-            # Find elements on current page
-            page_blocks = []
-            for selector in review_selectors:
-                elements = soup.select(selector)
-                if elements:
-                    print(f"✅ Found {len(elements)} reviews on page {page_num}")
-                    page_blocks = elements
-                    break
-            
-            if not page_blocks:
-                print(f"⚠️ No reviews found on page {page_num}")
-                break
+        html = res.text
 
-            for block in page_blocks:
-                try:
-                    if len(reviews) >= limit:
-                        break
+        while count < limit:
+            logger.debug("Scraping page %d for URL: %s", page_num, target_url)
+            yield {"type": "progress", "stage": "parse", "page": page_num, "count": count, "total": limit, "message": f"Scraping page {page_num}..."}
 
-                    # Title
-                    title_elem = block.select_one("[data-hook='review-title']") or \
-                                 block.select_one(".review-title")
-                    
-                    review_title = "Review"
-                    if title_elem:
-                        review_title = title_elem.get_text(strip=True)
-                        review_title = re.sub(r'^\d\.\d out of 5 stars\s*', '', review_title) # clean stars
-                        review_title = re.sub(r'^\d\.\d out of 5 stars', '', review_title) # double check
-
-                    # Text
-                    text_elem = block.select_one("[data-hook='review-body']") or \
-                                block.select_one(".review-text-content")
-                    
-                    review_text = "No review text."
-                    if text_elem:
-                        # Use separator to avoid jamming words together
-                        review_text = text_elem.get_text(" ", strip=True)
-
-                    # Rating
-                    rating_value = 3.0
-                    rating_elem = block.select_one("[data-hook='review-star-rating']") or \
-                                  block.select_one(".a-icon-star")
-                    
-                    if rating_elem:
-                        rating_text = rating_elem.get_text(strip=True)
-                        match = re.search(r'(\d+(\.\d+)?)', rating_text)
-                        if match:
-                            rating_value = float(match.group(1))
-
-                    reviews.append({
-                        "product_id": product_id,
-                        "review_title": review_title.strip(),
-                        "review_text": review_text,
-                        "rating": rating_value
-                    })
-                except Exception as e:
-                    print(f"⚠️ Error processing review: {e}")
-                    continue
+            # The whole page is parsed so a page cut short by limit can be resumed where it stopped
+            page_reviews, next_href = await asyncio.to_thread(parse_review_page, html, product_id, None, profile)
+            html = None
             
-            print(f"Collected {len(reviews)}/{limit} reviews so far.")
-            yield {"type": "progress", "count": len(reviews), "total": limit, "message": f"Collected {len(reviews)} reviews..."}
+            if not page_reviews:
+                logger.info("No reviews found on page %d", page_num)
+                break
+
+            taken = page_reviews[skip:skip + limit - count]
+            count += len(taken)
+            logger.debug("Collected %d/%d reviews so far", count, limit)
+            if skip + len(taken) < len(page_reviews):
+                next_url, next_offset = target_url, skip + len(taken)
+            else:
+                next_url, next_offset = (urljoin(target_url, next_href) if next_href else None), 0
+            skip = 0
+            yield {"type": "page", "page": page_num, "reviews": taken, "next_url": next_url, "next_offset": next_offset}
             
-            if len(reviews) >= limit:
+            if count >= limit:
                 break
 
-            # Pagination Logic
-            next_page = soup.select_one("li.a-last a") or soup.select_one("a.a-pagination-next")
-            if next_page and 'href' in next_page.attrs:
-                next_url = urljoin("https://www.amazon.in", next_page['href'])
-                print(f"Navigating to next page: {next_url}")
-                await asyncio.sleep(random.uniform(2, 5)) 
+            if next_url:
+                logger.debug("Navigating to next page: %s", next_url)
+                await asyncio.sleep(random.uniform(2, 5) * SCRAPE_DELAY_SCALE)
+                yield {"type": "progress", "stage": "fetch", "page": page_num + 1, "count": count, "total": limit, "message": f"Fetching page {page_num + 1}..."}
                 
                 try:
-                    res = requests.get(next_url, headers=headers, timeout=15)
+                    res = await asyncio.to_thread(_fetch, next_url, headers, "reviews")
                     # Check for blocking again
-                    if res.status_code == 503 or "Enter the characters you see below" in res.text:
-                        print("⚠️ Amazon blocked the next page request.")
-                        break
+                    if profile.is_blocked(res):
+                        logger.warning("%s blocked the next page request: %s", profile.label, next_url)
+                        yield {"type": "error", "message": f"{profile.label} blocked the request for page {page_num + 1} (Captcha/Bot Detection)."}
+                        return
                     
                     res.raise_for_status()
-                    soup = BeautifulSoup(res.text, "html.parser")
+                    html = res.text
                     page_num += 1
-                    target_url = next_url # Update for logging
+                    target_url = next_url  # The page being parsed, and where a checkpoint cut short on it resumes
                 except Exception as e:
-                    print(f"Failed to fetch next page: {e}")
-                    break
+                    logger.warning("Failed to fetch next page: %s", e)
+                    yield {"type": "error", "message": f"Failed to fetch page {page_num + 1}: {e}"}
+                    return
             else:
-                print("No next page found.")
+                logger.debug("No next page found")
                 break
 
-        print(f"✅ Successfully scraped {len(reviews)} reviews")
-        yield {"type": "result", "reviews": reviews}
+        logger.info("Scraped %d reviews from %s", count, url)
         
     except Exception as e:
-        print(f"❌ Error scraping reviews: {str(e)}")
+        logger.exception("Error scraping reviews from %s", url)
         yield {"type": "error", "message": f"Failed to retrieve reviews: {str(e)}"}
@@ -1,7 +1,22 @@
-from textblob import TextBlob
+_TextBlob = None
+
+
+def _textblob():
+    # TextBlob pulls in nltk and scipy (~1s); import it on first use, not at app startup
+    global _TextBlob
+    if _TextBlob is None:
+        from textblob import TextBlob
+        _TextBlob = TextBlob
+    return _TextBlob
+
+
+def warm_up():
+    """Import TextBlob and score one sentence so the first real request pays nothing"""
+    analyze_sentiment("warm up")
+
 
 def analyze_sentiment(text: str):
-    blob = TextBlob(text)
+    blob = _textblob()(text)
     polarity = blob.sentiment.polarity  # -1 to +1
 
     if polarity > 0.1:
@@ -0,0 +1,57 @@
+import asyncio
+
+# Scrapes currently running, keyed by canonical product URL
+_in_flight = {}
+
+
+class InFlightScrape:
+    """A running scrape whose NDJSON events are shared by every request for the same product"""
+
+    def __init__(self, key):
+        self.key = key
+        self.events = []
+        self.done = False
+        self._wakeup = asyncio.Event()
+
+    def _publish(self, line):
+        self.events.append(line)
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    async def run(self, event_stream):
+        try:
+            async for line in event_stream:
+                self._publish(line)
+        finally:
+            self.done = True
+            _in_flight.pop(self.key, None)
+            self._wakeup.set()
+
+    async def subscribe(self):
+        """Replay the events published so far, then follow the live stream until the scrape ends"""
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                return
+            await self._wakeup.wait()
+
+
+def join_or_start(key, make_event_stream):
+    """Return the in-flight scrape for key, starting it with make_event_stream() if none is running.
+
+    The scrape runs as its own task so that a client disconnecting does not cancel
+    the work for the other subscribers.
+    """
+    job = _in_flight.get(key)
+    if job is None:
+        job = InFlightScrape(key)
+        _in_flight[key] = job
+        job.task = asyncio.create_task(job.run(make_event_stream()))
+    return job
+
+
+def in_flight_keys():
+    return list(_in_flight)
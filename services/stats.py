@@ -1,3 +1,8 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
 def calculate_stats(reviews):
     total = len(reviews)
     pos = sum(1 for r in reviews if r.get("sentiment", "").lower() == "positive")
@@ -33,11 +38,7 @@ def calculate_correlations(reviews):
         }
     
     from scipy.stats import pearsonr
-    def get_description(r):
-        if abs(r) > 0.7: return "Strong"
-        if abs(r) > 0.4: return "Moderate"
-        if abs(r) > 0.1: return "Weak"
-        return "Negligible"
+    get_description = _describe_correlation
 
     try:
         ratings = [r["rating"] for r in reviews]
@@ -71,7 +72,7 @@ def calculate_correlations(reviews):
             "rating_length": rating_length
         }
     except Exception as e:
-        print(f"Correlation error: {e}")
+        logger.warning("Correlation error: %s", e)
         err_val = {"r": 0, "p": 0, "text": "Calculation error"}
         return {
             "rating_sentiment": err_val,
@@ -171,3 +172,130 @@ def get_sentiment_by_rating(reviews):
     return averages
 
 
+
+
+# Sentiment labels as small integer codes for column-oriented data (0 = missing/unknown)
+SENTIMENT_CODES = {"positive": 1, "neutral": 2, "negative": 3}
+
+
+def _describe_correlation(r):
+    if abs(r) > 0.7: return "Strong"
+    if abs(r) > 0.4: return "Moderate"
+    if abs(r) > 0.1: return "Weak"
+    return "Negligible"
+
+
+def calculate_metrics_from_columns(ratings, polarities, lengths, sentiment_codes):
+    """Every dashboard metric from numpy columns in one pass.
+
+    Returns the same values as calculate_stats, calculate_correlations,
+    calculate_detailed_sentiment_distribution, calculate_advanced_metrics and
+    get_sentiment_by_rating applied to the equivalent list of review dicts.
+    Missing ratings and polarities are NaN.
+    """
+    import numpy as np
+    from scipy import stats as scipy_stats
+    from scipy.stats import pearsonr
+
+    total = len(ratings)
+    ratings = np.asarray(ratings, dtype=np.float64)
+    polarities = np.asarray(polarities, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.float64)
+    sentiment_codes = np.asarray(sentiment_codes)
+
+    # Star buckets use Python's round-half-to-even, as int(round(r)) does
+    star_of = np.rint(np.nan_to_num(ratings, nan=0.0))
+    star_counts = [int(np.count_nonzero(star_of == star)) for star in range(1, 6)]
+    stats = {
+        "total": total,
+        "positive": int(np.count_nonzero(sentiment_codes == SENTIMENT_CODES["positive"])),
+        "negative": int(np.count_nonzero(sentiment_codes == SENTIMENT_CODES["negative"])),
+        "neutral": int(np.count_nonzero(sentiment_codes == SENTIMENT_CODES["neutral"])),
+        "avg_rating": round(float(np.nansum(ratings)) / total, 2) if total else 0,
+        "stars": star_counts
+    }
+
+    if not total:
+        default_val = {"r": 0, "p": 0, "text": "No data available"}
+        correlations = {"rating_sentiment": default_val, "rating_length": default_val}
+    else:
+        def correlate(x, y):
+            valid = ~(np.isnan(x) | np.isnan(y))
+            x, y = x[valid], y[valid]
+            if len(x) < 2 or np.ptp(x) == 0 or np.ptp(y) == 0:
+                return {"r": 0, "p": 0, "text": "Insufficient variance"}
+            r, p = pearsonr(x, y)
+            return {
+                "r": round(float(r), 2),
+                "p": round(float(p), 4),
+                "text": f"{_describe_correlation(r)} {'positive' if r > 0 else 'negative'} relationship"
+            }
+        correlations = {
+            "rating_sentiment": correlate(ratings, polarities),
+            "rating_length": correlate(ratings, lengths)
+        }
+
+    p = np.nan_to_num(polarities, nan=0.0)
+    detailed_sentiment = {
+        "very_positive": int(np.count_nonzero(p > 0.5)),
+        "positive": int(np.count_nonzero((p > 0.1) & (p <= 0.5))),
+        "neutral": int(np.count_nonzero((p >= -0.1) & (p <= 0.1))),
+        "negative": int(np.count_nonzero((p >= -0.5) & (p < -0.1))),
+        "very_negative": int(np.count_nonzero(p < -0.5))
+    }
+
+    def calc_metrics(data):
+        data = data[~np.isnan(data)]
+        if len(data) < 2:
+            return {"mean": 0, "median": 0, "std": 0, "variance": 0, "skewness": 0, "kurtosis": 0}
+        return {
+            "mean": round(float(np.mean(data)), 6),
+            "median": round(float(np.median(data)), 6),
+            "std": round(float(np.std(data, ddof=1)), 6),
+            "variance": round(float(np.var(data, ddof=1)), 6),
+            "skewness": round(float(scipy_stats.skew(data)), 6),
+            "kurtosis": round(float(scipy_stats.kurtosis(data)), 6)
+        }
+    advanced_metrics = {"rating": calc_metrics(ratings), "polarity": calc_metrics(polarities)}
+
+    sentiment_by_rating = []
+    for star in range(1, 6):
+        in_star = star_of == star
+        if in_star.any():
+            # Same 0-100 mapping as get_sentiment_by_rating
+            sentiment_by_rating.append(round((float(p[in_star].mean()) + 1) * 50, 1))
+        else:
+            sentiment_by_rating.append(0)
+
+    return {
+        "stats": stats,
+        "correlations": correlations,
+        "detailed_sentiment": detailed_sentiment,
+        "advanced_metrics": advanced_metrics,
+        "sentiment_by_rating": sentiment_by_rating
+    }
+
+
+def calculate_grouped_metrics(group_ids, ratings, polarities, lengths, sentiment_codes):
+    """calculate_metrics_from_columns for each group of rows sorted by group_ids.
+
+    The columns are sliced at group boundaries rather than filtered per group, so
+    the cost is proportional to the rows passed in, not groups x rows.
+    """
+    import numpy as np
+
+    group_ids = np.asarray(group_ids)
+    ratings, polarities, lengths, sentiment_codes = (
+        np.asarray(column) for column in (ratings, polarities, lengths, sentiment_codes)
+    )
+    if not len(group_ids):
+        return {}
+    starts = np.flatnonzero(np.r_[True, group_ids[1:] != group_ids[:-1]])
+    ends = np.r_[starts[1:], len(group_ids)]
+
+    return {
+        str(group_ids[start]): calculate_metrics_from_columns(
+            ratings[start:end], polarities[start:end], lengths[start:end], sentiment_codes[start:end]
+        )
+        for start, end in zip(starts, ends)
+    }
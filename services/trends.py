@@ -0,0 +1,70 @@
+import math
+from datetime import date, timedelta
+
+def _bucket_start(day, granularity):
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(start, granularity):
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def aggregate_trends(rows, granularity="day", window=7):
+    """Re-aggregate daily rollup rows into day/week/month buckets with moving averages.
+
+    rows are (day, review_count, rating_sum, polarity_sum, polarity_sq_sum,
+    positive_count, neutral_count, negative_count) tuples with day as 'YYYY-MM-DD'.
+    Empty buckets between the first and last day with data are filled with zero counts
+    so the series is evenly spaced; moving averages are weighted by review count over `window` buckets.
+    """
+    buckets = {}
+    for day, count, rating_sum, polarity_sum, polarity_sq_sum, positive, neutral, negative in rows:
+        key = _bucket_start(date.fromisoformat(day), granularity)
+        b = buckets.setdefault(key, [0, 0.0, 0.0, 0.0, 0, 0, 0])
+        b[0] += count
+        b[1] += rating_sum
+        b[2] += polarity_sum
+        b[3] += polarity_sq_sum
+        b[4] += positive
+        b[5] += neutral
+        b[6] += negative
+
+    if not buckets:
+        return []
+
+    series = []
+    window_sums = []
+    current, last = min(buckets), max(buckets)
+    while current <= last:
+        count, rating_sum, polarity_sum, polarity_sq_sum, positive, neutral, negative = buckets.get(current, (0, 0.0, 0.0, 0.0, 0, 0, 0))
+        window_sums.append((count, rating_sum, polarity_sum))
+        if len(window_sums) > window:
+            window_sums.pop(0)
+        window_count = sum(w[0] for w in window_sums)
+
+        point = {
+            "period": current.isoformat(),
+            "review_count": count,
+            "avg_rating": round(rating_sum / count, 4) if count else None,
+            "avg_polarity": round(polarity_sum / count, 4) if count else None,
+            # Population standard deviation from the running sums
+            "polarity_std": round(math.sqrt(max(0.0, polarity_sq_sum / count - (polarity_sum / count) ** 2)), 4) if count else None,
+            "positive": positive,
+            "neutral": neutral,
+            "negative": negative,
+            "positive_share": round(positive / count, 4) if count else None,
+            "moving_avg_rating": round(sum(w[1] for w in window_sums) / window_count, 4) if window_count else None,
+            "moving_avg_polarity": round(sum(w[2] for w in window_sums) / window_count, 4) if window_count else None
+        }
+        series.append(point)
+        current = _next_bucket(current, granularity)
+
+    return series